@@ -1,12 +1,41 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+# The CPU budget sets the OpenMP/MKL/OpenBLAS env vars that numpy, cv2 and torch read once when
+# their native pools load, so it is applied before anything below imports them
+import yaml
+from .src.resources import apply_cpu_budget
+
+def load_runtime_config(path: str) -> dict:
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+CFG = load_runtime_config("config.yaml")
+CPU = apply_cpu_budget(CFG)
+
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import Response, FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from PIL import Image, UnidentifiedImageError
+from typing import Optional, Tuple
+import asyncio
 import io
+import json
+import threading
+import time
+import math
 import numpy as np
-import yaml
 
-from .src.detection import process_image_np  # must accept and return RGB ndarrays
+from .src.detection import process_image_np, detect_image_np  # must accept and return RGB ndarrays
+from .src.reports import build_report_writer
+from .src.detection_store import build_detection_store
+from .src.jobs import build_job_queue, JobWorkers, TERMINAL
+from .src.live import LivePreview, decode_frame
+from .src.scheduler import build_scheduler
+from .src.scene_gate import get_scene_gate, with_rates
+from .src.near_dup import get_near_dup_index
+from .src.model_registry import get_model_registry, start_hot_reload
+from .src.lang_pool import get_analyzer_pool
+from .src.inference_pool import build_inference_pool, combine_stats
+from .src.ocr import warm_analyzer
 
 app = FastAPI()
 
@@ -21,18 +50,56 @@ app.add_middleware(
 ALLOWED = {"image/jpeg", "image/png", "image/webp", "image/gif"}
 MAX_BYTES = 20 * 1024 * 1024  # 20 MB
 
-def load_runtime_config(path: str) -> dict:
-    with open(path, "r") as f:
-        return yaml.safe_load(f)
-    
-CFG = load_runtime_config("config.yaml")
+REPORTS = build_report_writer(CFG)
+DETECTIONS = build_detection_store(CFG)
+JOBS = build_job_queue(CFG)
+SCHEDULER = build_scheduler(CFG)
+POOL = build_inference_pool(CFG)
+JOB_WORKERS: Optional[JobWorkers] = None
+
+@app.on_event("startup")
+def start_models() -> None:
+    # loads and warms the default models off the event loop, so the first request is not a cold start
+    preload_all = bool((CFG.get("models") or {}).get("preload", False))
+
+    def preload():
+        try:
+            if preload_all:
+                get_model_registry().get("yolo", CFG["paths"]["yolo_weights"])
+                get_model_registry().get("analyzer", "")
+            # degraded tiers are picked at peak load, their analyzers must be ready before then
+            if SCHEDULER is not None:
+                for tier in ("reduced", "minimal"):
+                    warm_analyzer(SCHEDULER.config(tier))
+        except Exception as e:
+            print(f"[models] preload failed: {type(e).__name__}: {e}")
+
+    if preload_all or SCHEDULER is not None:
+        threading.Thread(target=preload, name="model-preload", daemon=True).start()
+    start_hot_reload(CFG)
+
+@app.on_event("startup")
+def start_job_workers() -> None:
+    global JOB_WORKERS
+    if JOBS is None:
+        return
+    JOB_WORKERS = JobWorkers(JOBS, run_job, workers=int((CFG.get("jobs") or {}).get("workers", 2)))
+    JOB_WORKERS.start()
+
+@app.on_event("shutdown")
+def close_reports() -> None:
+    if JOB_WORKERS is not None:
+        JOB_WORKERS.stop()
+    if POOL is not None:
+        POOL.close()
+    if REPORTS is not None:
+        REPORTS.close()
 
 def ensure_image_ct(content_type: str) -> None:
     if content_type not in ALLOWED:
         raise HTTPException(415, f"Unsupported Content-Type {content_type}")
 
-@app.post("/process")
-async def process(file: UploadFile = File(...)):
+async def read_upload(file: UploadFile) -> bytes:
     ensure_image_ct(file.content_type)
 
     raw = await file.read()
@@ -40,45 +107,382 @@ async def process(file: UploadFile = File(...)):
         raise HTTPException(400, "Empty file")
     if len(raw) > MAX_BYTES:
         raise HTTPException(413, f"File too large, max {MAX_BYTES} bytes")
+    return raw
 
+def decode_rgb(raw: bytes) -> np.ndarray:
     # Decode once, verify, then reopen and convert to RGB
     try:
         Image.open(io.BytesIO(raw)).verify()
         pil_in = Image.open(io.BytesIO(raw)).convert("RGB")
     except UnidentifiedImageError:
-        raise HTTPException(400, "Uploaded data is not a valid image")
+        raise ValueError("Uploaded data is not a valid image")
     except Exception as e:
-        raise HTTPException(400, f"Image parse error: {e}")
+        raise ValueError(f"Image parse error: {e}")
 
     # PIL Image -> NumPy RGB
     img_rgb = np.array(pil_in)
     if img_rgb.ndim != 3 or img_rgb.shape[2] != 3:
-        raise HTTPException(400, f"Expected RGB image, got shape {img_rgb.shape}")
+        raise ValueError(f"Expected RGB image, got shape {img_rgb.shape}")
+    return img_rgb
 
-    # Process on ndarray, then encode to JPEG
+async def read_upload_rgb(file: UploadFile) -> Tuple[bytes, np.ndarray]:
+    raw = await read_upload(file)
     try:
-        redacted_rgb, meta, applied = process_image_np(img_rgb, CFG)
+        img_rgb = decode_rgb(raw)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return raw, img_rgb
+
+def encode_jpeg(redacted_rgb: np.ndarray) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(np.asarray(redacted_rgb), mode="RGB").save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+def write_report(meta: dict, tag: str) -> None:
+    if REPORTS is None:
+        return
+    try:
+        REPORTS.write(meta)
     except Exception as e:
-        raise HTTPException(500, f"processing error: {type(e).__name__}: {e}")
+        # reporting must never fail a redaction
+        print(f"[{tag}] report write failed: {type(e).__name__}: {e}")
 
+def run_pipeline(img_rgb: np.ndarray, tier: Optional[str]) -> Tuple[bytes, tuple, dict, bool]:
+    """
+    Redacts and encodes one image, returns (jpeg_bytes, shape, meta, applied).
+    With the inference pool enabled the pixels travel through shared memory and the JPEG is
+    encoded straight from the slot, images too big for a slot run in this process.
+    """
+    if POOL is not None:
+        done = POOL.process(img_rgb, tier, lambda view: (encode_jpeg(view), view.shape))
+        if done is not None:
+            (jpeg_bytes, shape), meta, applied = done
+            return jpeg_bytes, shape, meta, applied
+
+    cfg = CFG if tier is None else SCHEDULER.config(tier)
+    redacted_rgb, meta, applied = process_image_np(img_rgb, cfg, DETECTIONS)
     if redacted_rgb.ndim != 3 or redacted_rgb.shape[2] != 3:
         raise HTTPException(500, f"Processor returned invalid shape {redacted_rgb.shape}")
+    return encode_jpeg(redacted_rgb), redacted_rgb.shape, meta, applied
 
-    buf = io.BytesIO()
-    Image.fromarray(redacted_rgb, mode="RGB").save(buf, format="JPEG", quality=90)
-    jpeg_bytes = buf.getvalue()
+@app.post("/process")
+async def process(file: UploadFile = File(...), x_deadline_ms: Optional[float] = Header(None)):
+    """
+    With shedding enabled, X-Deadline-Ms (or shedding.default_deadline_ms) picks the pipeline
+    tier, reported back in X-Pipeline-Tier and meta["tier"].
+    """
+    t_in = time.perf_counter()
+    raw, img_rgb = await read_upload_rgb(file)
+
+    # Process on ndarray in the threadpool, so in-flight requests are visible to the scheduler
+    tier = "full"
+    try:
+        if SCHEDULER is None:
+            jpeg_bytes, out_shape, meta, applied = await run_in_threadpool(run_pipeline, img_rgb, None)
+        else:
+            left_ms = None if x_deadline_ms is None else x_deadline_ms - (time.perf_counter() - t_in) * 1000.0
+            tier = SCHEDULER.choose(left_ms)
+            with SCHEDULER.track(tier):
+                jpeg_bytes, out_shape, meta, applied = await run_in_threadpool(run_pipeline, img_rgb, tier)
+            SCHEDULER.observe(tier, meta["timings_ms"]["total"])
+    except TimeoutError as e:
+        raise HTTPException(503, f"inference pool busy: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"processing error: {type(e).__name__}: {e}")
 
     if not jpeg_bytes:
         raise HTTPException(500, "processing returned empty bytes")
 
     print(
         f"[process] ct_in={file.content_type} size_in={len(raw)}B "
-        f"out_shape={redacted_rgb.shape} size_out={len(jpeg_bytes)}B "
-        f"applied={applied} counts={meta.get('counts')}"
+        f"out_shape={out_shape} size_out={len(jpeg_bytes)}B "
+        f"applied={applied} tier={tier} counts={meta.get('counts')}"
     )
 
+    write_report(meta, "process")
+
     headers = {
         "Content-Disposition": 'inline; filename="result.jpg"',
         "X-Redactions": "some" if applied else "none",
+        "X-Pipeline-Tier": tier,
     }
     return Response(content=jpeg_bytes, media_type="image/jpeg", headers=headers)
+
+def box_payload(boxes: list, sx: float, sy: float, out_w: int, out_h: int) -> Tuple[list, list]:
+    # [x1, y1, x2, y2, label_index] rounded outward after scaling, so a box never shrinks
+    labels = []
+    out = []
+    for b in boxes:
+        label = b.get("label", "redact")
+        if label not in labels:
+            labels.append(label)
+        out.append([
+            max(0, math.floor(b["x1"] * sx)),
+            max(0, math.floor(b["y1"] * sy)),
+            min(out_w, math.ceil(b["x2"] * sx)),
+            min(out_h, math.ceil(b["y2"] * sy)),
+            labels.index(label),
+        ])
+    return labels, out
+
+@app.post("/detect")
+async def detect(
+    file: UploadFile = File(...),
+    orig_width: Optional[int] = Form(None),
+    orig_height: Optional[int] = Form(None),
+    x_deadline_ms: Optional[float] = Header(None),
+):
+    """
+    Boxes only, for clients that redact on device. The upload may be a downscaled proxy,
+    with orig_width and orig_height boxes are scaled back to the full-size original.
+    Boxes are [x1, y1, x2, y2, label_index] into "labels", rounded outward when scaled.
+    Admitted through the same shedding tiers as /process, the tier is returned in X-Pipeline-Tier.
+    """
+    t_in = time.perf_counter()
+    raw, img_rgb = await read_upload_rgb(file)
+    h, w = img_rgb.shape[:2]
+
+    if (orig_width is None) != (orig_height is None):
+        raise HTTPException(400, "orig_width and orig_height must be sent together")
+    if orig_width is not None and (orig_width <= 0 or orig_height <= 0):
+        raise HTTPException(400, "orig_width and orig_height must be positive")
+    out_w, out_h = (orig_width, orig_height) if orig_width is not None else (w, h)
+    sx, sy = out_w / w, out_h / h
+
+    # Detect in the threadpool, so the event loop keeps serving /live and job event streams
+    tier = "full"
+    try:
+        if SCHEDULER is None:
+            lp_boxes, pii_boxes, meta = await run_in_threadpool(detect_image_np, img_rgb, CFG, DETECTIONS)
+        else:
+            left_ms = None if x_deadline_ms is None else x_deadline_ms - (time.perf_counter() - t_in) * 1000.0
+            tier = SCHEDULER.choose(left_ms)
+            with SCHEDULER.track(tier):
+                lp_boxes, pii_boxes, meta = await run_in_threadpool(detect_image_np, img_rgb, SCHEDULER.config(tier), DETECTIONS)
+            # not observed, the tier latencies are full /process runs including redaction
+    except Exception as e:
+        raise HTTPException(500, f"processing error: {type(e).__name__}: {e}")
+
+    labels, boxes = box_payload(lp_boxes + pii_boxes, sx, sy, out_w, out_h)
+
+    print(
+        f"[detect] ct_in={file.content_type} size_in={len(raw)}B "
+        f"in_shape={img_rgb.shape} out_size={out_w}x{out_h} tier={tier} counts={meta.get('counts')}"
+    )
+    write_report(meta, "detect")
+
+    payload = {"width": out_w, "height": out_h, "labels": labels, "boxes": boxes}
+    return Response(content=json.dumps(payload), media_type="application/json", headers={"X-Pipeline-Tier": tier})
+
+@app.get("/stats")
+def stats():
+    """
+    Counters of the optional stages in this API worker process, null when a stage is disabled.
+    With the inference pool on, counters of the pool workers are added in, as of each one's last image.
+    """
+    gate = get_scene_gate(CFG)
+    index = get_near_dup_index(CFG)
+    pool = get_analyzer_pool(CFG)
+    workers = list(POOL.worker_stats().values()) if POOL is not None else []
+    gate_stats = combine_stats([gate.stats() if gate is not None else None] + [w["scene_gate"] for w in workers])
+    return {
+        "scene_gate": with_rates(gate_stats) if gate_stats is not None else None,
+        "near_dup": combine_stats([index.stats() if index is not None else None] + [w["near_dup"] for w in workers]),
+        "shedding": SCHEDULER.stats() if SCHEDULER is not None else None,
+        "lang_pool": combine_stats([pool.stats() if pool is not None else None] + [w["lang_pool"] for w in workers]),
+        "inference_pool": POOL.stats() if POOL is not None else None,
+    }
+
+@app.get("/models")
+def models():
+    """
+    Models of this process, plus those of each inference pool worker as of its last image.
+    """
+    registry = get_model_registry()
+    out = {"versions": registry.versions(), "history": list(registry.history)}
+    if POOL is not None:
+        out["workers"] = {str(pid): w["models"] for pid, w in POOL.worker_stats().items()}
+    return out
+
+@app.post("/models/reload")
+async def reload_models():
+    """
+    Checks every loaded model for a new version now instead of waiting for the next poll.
+    Inference pool workers run the same check before their next image.
+    """
+    swapped = await run_in_threadpool(get_model_registry().check)
+    out = {"swapped": [{"kind": k, "source": s, "version": v} for k, s, v in swapped]}
+    if POOL is not None:
+        out["worker_reload_generation"] = POOL.request_reload()
+    return out
+
+# ---------- Async jobs for large or slow uploads ----------
+
+def run_job(raw: bytes, content_type: str) -> Tuple[bytes, dict, bool]:
+    # ValueError marks bad input, the worker fails the job without retrying
+    img_rgb = decode_rgb(raw)
+    redacted_rgb, meta, applied = process_image_np(img_rgb, CFG, store=DETECTIONS)
+    jpeg_bytes = encode_jpeg(redacted_rgb)
+    if not jpeg_bytes:
+        raise RuntimeError("processing returned empty bytes")
+    print(f"[jobs] ct_in={content_type} size_in={len(raw)}B applied={applied} counts={meta.get('counts')}")
+    write_report(meta, "jobs")
+    return jpeg_bytes, meta, applied
+
+def require_jobs():
+    if JOBS is None:
+        raise HTTPException(404, "Jobs are disabled, set jobs.enabled in config.yaml")
+    return JOBS
+
+def job_status(job: dict) -> dict:
+    meta = job.get("meta") or {}
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "attempts": job["attempts"],
+        "created": job["created"],
+        "updated": job["updated"],
+        "expires": job["expires"],
+        "error": job["error"],
+        "applied": job["applied"],
+        "counts": meta.get("counts"),
+    }
+
+async def get_job_or_404(job_id: str) -> dict:
+    job = await run_in_threadpool(require_jobs().get, job_id)
+    if job is None:
+        raise HTTPException(404, f"Unknown or expired job {job_id}")
+    return job
+
+@app.post("/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...), priority: int = Form(0)):
+    """
+    Queues the upload for the worker pool and returns its id at once.
+    Poll GET /jobs/{id} or follow GET /jobs/{id}/events, then fetch GET /jobs/{id}/result.
+    """
+    jobs = require_jobs()
+    raw = await read_upload(file)
+
+    max_queued = int((CFG.get("jobs") or {}).get("max_queued", 1000))
+    if await run_in_threadpool(jobs.depth) >= max_queued:
+        raise HTTPException(503, "Job queue is full, retry later")
+
+    job_id = await run_in_threadpool(jobs.enqueue, raw, file.content_type, priority)
+    JOB_WORKERS.notify()
+    print(f"[jobs] queued {job_id} ct_in={file.content_type} size_in={len(raw)}B priority={priority}")
+    return {"id": job_id, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return job_status(await get_job_or_404(job_id))
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-sent events, one "status" event per change until the job is done or failed.
+    """
+    await get_job_or_404(job_id)
+    jobs = require_jobs()
+
+    async def stream():
+        last = None
+        while True:
+            job = await run_in_threadpool(jobs.get, job_id)
+            if job is None:
+                yield "event: gone\ndata: {}\n\n"
+                return
+            status = job_status(job)
+            if (status["status"], status["attempts"]) != last:
+                last = (status["status"], status["attempts"])
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+            if status["status"] in TERMINAL:
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = await get_job_or_404(job_id)
+    if job["status"] == "failed":
+        raise HTTPException(422, f"Job failed: {job['error']}")
+    if job["status"] != "done":
+        raise HTTPException(409, f"Job is {job['status']}")
+
+    headers = {
+        "Content-Disposition": 'inline; filename="result.jpg"',
+        "X-Redactions": "some" if job["applied"] else "none",
+    }
+    return FileResponse(JOBS.result_path(job_id), media_type="image/jpeg", headers=headers)
+
+# ---------- Live camera preview ----------
+
+@app.websocket("/live")
+async def live(ws: WebSocket):
+    """
+    Client sends binary JPEG or PNG frames, server answers each processed frame with
+    {"frame_id", "width", "height", "labels", "boxes", "text_fresh", "dropped", "timings_ms"}.
+    Only the newest frame is kept, frames that arrive while one is processed replace it unseen.
+    """
+    await ws.accept()
+    preview = LivePreview(CFG)
+    max_bytes = int((CFG.get("live") or {}).get("max_frame_bytes", 1024 * 1024))
+    slot = {"raw": None, "id": 0, "dropped": 0, "closed": False}
+    ready = asyncio.Event()
+
+    async def receive() -> None:
+        try:
+            while True:
+                msg = await ws.receive()
+                if msg["type"] == "websocket.disconnect":
+                    return
+                raw = msg.get("bytes")
+                if not raw or len(raw) > max_bytes:
+                    continue
+                if slot["raw"] is not None:
+                    slot["dropped"] += 1
+                slot["raw"] = raw
+                slot["id"] += 1
+                ready.set()
+        finally:
+            slot["closed"] = True
+            ready.set()
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            await ready.wait()
+            ready.clear()
+            if slot["closed"]:
+                break
+            raw, frame_id = slot["raw"], slot["id"]
+            slot["raw"] = None
+            if raw is None:
+                continue
+
+            try:
+                img_rgb = decode_frame(raw)
+                result = await run_in_threadpool(preview.process, img_rgb)
+            except ValueError as e:
+                await ws.send_json({"frame_id": frame_id, "error": str(e)})
+                continue
+
+            labels, boxes = box_payload(result["boxes"], 1.0, 1.0, result["width"], result["height"])
+            await ws.send_json({
+                "frame_id": frame_id,
+                "width": result["width"],
+                "height": result["height"],
+                "labels": labels,
+                "boxes": boxes,
+                "text_fresh": result["text_fresh"],
+                "dropped": slot["dropped"],
+                "timings_ms": result["timings_ms"],
+            })
+    except Exception as e:
+        print(f"[live] connection ended: {type(e).__name__}: {e}")
+    finally:
+        receiver.cancel()
+        print(f"[live] closed after {preview.frames} frames, dropped={slot['dropped']}")
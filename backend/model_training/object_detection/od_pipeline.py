@@ -1,5 +1,6 @@
 import argparse
 import io
+import os
 import shutil
 from pathlib import Path
 from typing import Dict, List, Tuple
@@ -12,52 +13,147 @@ from PIL import Image
 import numpy as np
 import json
 
+JPEG_MAGIC = b"\xff\xd8\xff"
+
+def _export_hf_row(job: Tuple[bytes, int, int, list, list, str, str]) -> int:
+    """
+    Writes one image and its label file. Runs in a worker process, so only plain data goes in.
+    JPEG source bytes are written as-is, anything else is decoded once and re-encoded.
+    """
+    img_bytes, w, h, bboxes, cats, img_path, lbl_path = job
+
+    if img_bytes[:3] == JPEG_MAGIC:
+        if not w or not h:
+            # header only, Pillow does not decode pixels for .size
+            with Image.open(io.BytesIO(img_bytes)) as im:
+                w, h = im.size
+        with open(img_path, "wb") as f:
+            f.write(img_bytes)
+    else:
+        with Image.open(io.BytesIO(img_bytes)) as im:
+            im = im.convert("RGB")
+            w, h = w or im.width, h or im.height
+            im.save(img_path, format="JPEG", quality=90)
+
+    # objects.bbox is [[x, y, w, h], ...] in pixels
+    lines = []
+    for bb, cat in zip(bboxes, cats):
+        x, y, bw, bh = map(float, bb)
+        # convert to YOLO normalized cx, cy, bw, bh
+        cx = (x + bw / 2.0) / w
+        cy = (y + bh / 2.0) / h
+        nw = bw / w
+        nh = bh / h
+        if nw <= 0 or nh <= 0:
+            continue
+        lines.append(f"{int(cat)} {cx:.6f} {cy:.6f} {nw:.6f} {nh:.6f}")
+
+    with open(lbl_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    return len(lines)
+
+def _hf_row_bytes(im) -> bytes:
+    # With decode=False rows carry {"bytes", "path"}, older versions may still hand out PIL images
+    if isinstance(im, dict):
+        if im.get("bytes"):
+            return im["bytes"]
+        with open(im["path"], "rb") as f:
+            return f.read()
+    buf = io.BytesIO()
+    im.convert("RGB").save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
 def export_hf_parquet_to_yolo(
     repo_id: str,
     out_root: Path,
     split_map: dict = None,  # e.g., {"train": "train", "val": "validation"}
     class_name: str = "license-plate",
+    streaming: bool = False,
+    workers: int = 0,
+    max_inflight: int = 0,
+    incremental: bool = False,
 ):
+    """
+    Exports a HF detection dataset to the YOLO folder layout.
+    streaming=True reads rows lazily instead of materializing the split. workers > 1 sends image
+    writes and label files to a process pool, with at most max_inflight rows queued
+    (default workers * 8) so memory stays bounded.
+    incremental=True names outputs by row content hash and keeps a manifest, so only new or
+    changed rows are written and rows gone from the source are removed.
+    """
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    from datasets import Image as HFImage
+
     if split_map is None:
         split_map = {"train": "train", "val": "validation"}
+    max_inflight = max_inflight or max(1, workers) * 8
 
     names = {0: class_name}
-    for split_key, hf_split in split_map.items():
-        ds = load_dataset(repo_id, split=hf_split, streaming=False)
-        img_dir = out_root / split_key / "images"
-        lbl_dir = out_root / split_key / "labels"
-        img_dir.mkdir(parents=True, exist_ok=True)
-        lbl_dir.mkdir(parents=True, exist_ok=True)
-
-        for i, row in enumerate(ds):
-            # row["image"] is a PIL Image or dict depending on version, normalize to PIL
-            im = row["image"]
-            if isinstance(im, dict) and "bytes" in im:
-                im = Image.open(io.BytesIO(im["bytes"])).convert("RGB")
-            w = int(row.get("width", im.width))
-            h = int(row.get("height", im.height))
-
-            stem = f"{i:07d}"
-            img_path = img_dir / f"{stem}.jpg"
-            im.save(img_path, quality=90)
-
-            # objects.bbox is [[x, y, w, h], ...] in pixels
-            bboxes = row["objects"]["bbox"]
-            cats = row["objects"]["category"]
-
-            lines = []
-            for bb, cat in zip(bboxes, cats):
-                x, y, bw, bh = map(float, bb)
-                # convert to YOLO normalized cx, cy, bw, bh
-                cx = (x + bw / 2.0) / w
-                cy = (y + bh / 2.0) / h
-                nw = bw / w
-                nh = bh / h
-                if nw <= 0 or nh <= 0:
+    manifest = load_manifest(out_root) if incremental else {}
+    seen = set()
+    skipped = 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for split_key, hf_split in split_map.items():
+            ds = load_dataset(repo_id, split=hf_split, streaming=streaming)
+            # keep the encoded bytes, decoding happens only when the source is not JPEG
+            ds = ds.cast_column("image", HFImage(decode=False))
+            img_dir = out_root / split_key / "images"
+            lbl_dir = out_root / split_key / "labels"
+            img_dir.mkdir(parents=True, exist_ok=True)
+            lbl_dir.mkdir(parents=True, exist_ok=True)
+
+            pending = set()
+            count = 0
+            for i, row in enumerate(ds):
+                count += 1
+                img_bytes = _hf_row_bytes(row["image"])
+                bboxes = list(row["objects"]["bbox"])
+                cats = list(row["objects"]["category"])
+
+                stem = f"{i:07d}"
+                if incremental:
+                    stem = _row_hash(img_bytes, bboxes, cats)
+                    seen.add(stem)
+                    if _manifest_files_exist(out_root, manifest.get(stem), stem):
+                        skipped += 1
+                        continue
+                    manifest[stem] = {"source_split": split_key, "split": split_key}
+
+                job = (
+                    img_bytes,
+                    int(row.get("width") or 0),
+                    int(row.get("height") or 0),
+                    bboxes,
+                    cats,
+                    str(img_dir / f"{stem}.jpg"),
+                    str(lbl_dir / f"{stem}.txt"),
+                )
+                if pool is None:
+                    _export_hf_row(job)
                     continue
-                lines.append(f"{int(cat)} {cx:.6f} {cy:.6f} {nw:.6f} {nh:.6f}")
-
-            (lbl_dir / f"{stem}.txt").write_text("\n".join(lines))
+                pending.add(pool.submit(_export_hf_row, job))
+                if len(pending) >= max_inflight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        fut.result()
+            for fut in pending:
+                fut.result()
+            print(f"Exported {split_key}: {count} images")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if incremental:
+        removed = 0
+        for stem in [h for h in manifest if h not in seen]:
+            split = manifest.pop(stem)["split"]
+            for p in _manifest_paths(out_root, split, stem):
+                if p.exists():
+                    p.unlink()
+            removed += 1
+        save_manifest(out_root, manifest)
+        print(f"Incremental export: {skipped} unchanged, {len(seen) - skipped} written, {removed} removed")
 
     # write data yaml
     data_yaml = {
@@ -72,6 +168,79 @@ def export_hf_parquet_to_yolo(
     return out_root / "license_plate.yaml"
 
 
+# ---------- Incremental builds ----------
+
+MANIFEST_NAME = "manifest.json"
+# resized training copy: cached image -> [source, size, mtime_ns, imgsz]
+CACHE_MANIFEST_NAME = "resize_cache.json"
+
+def _row_hash(img_bytes: bytes, bboxes: list, cats: list) -> str:
+    import hashlib
+    h = hashlib.blake2b(img_bytes, digest_size=10)
+    h.update(json.dumps([bboxes, cats]).encode("utf-8"))
+    return h.hexdigest()
+
+def _manifest_paths(out_root: Path, split: str, stem: str) -> Tuple[Path, Path]:
+    return out_root / split / "images" / f"{stem}.jpg", out_root / split / "labels" / f"{stem}.txt"
+
+def _manifest_files_exist(out_root: Path, entry, stem: str) -> bool:
+    if not entry:
+        return False
+    return all(p.exists() for p in _manifest_paths(out_root, entry["split"], stem))
+
+def load_manifest(out_root: Path) -> Dict[str, Dict[str, str]]:
+    """
+    Row hash -> {"source_split", "split"}. Output files are <split>/images/<hash>.jpg and
+    <split>/labels/<hash>.txt.
+    """
+    p = out_root / MANIFEST_NAME
+    if not p.exists():
+        return {}
+    with open(p, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(out_root: Path, manifest: Dict[str, Dict[str, str]]) -> None:
+    p = out_root / MANIFEST_NAME
+    tmp = p.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, sort_keys=True)
+    tmp.replace(p)
+
+def split_for_hash(stem: str, seed: int, ratios=(0.7, 0.2, 0.1)) -> str:
+    """
+    Stable split from the row hash, adding or removing rows never moves the others.
+    """
+    import hashlib
+    u = int.from_bytes(hashlib.blake2b(f"{seed}:{stem}".encode("utf-8"), digest_size=8).digest(), "big") / 2.0 ** 64
+    if u < ratios[0]:
+        return "train"
+    if u < ratios[0] + ratios[1]:
+        return "val"
+    return "test"
+
+def place_manifest_items(out_root: Path, manifest: Dict[str, Dict[str, str]], targets: Dict[str, str]) -> int:
+    """
+    Moves image and label files to their target split with atomic renames, no bytes are copied.
+    Returns the number of samples moved, the manifest is updated and saved.
+    """
+    for split in ["train", "val", "test"]:
+        for sub in ["images", "labels"]:
+            ensure_dir(out_root / split / sub)
+
+    moved = 0
+    for stem, entry in manifest.items():
+        dst_split = targets.get(stem, entry["split"])
+        if dst_split == entry["split"]:
+            continue
+        for src, dst in zip(_manifest_paths(out_root, entry["split"], stem), _manifest_paths(out_root, dst_split, stem)):
+            if src.exists():
+                src.replace(dst)
+        entry["split"] = dst_split
+        moved += 1
+    save_manifest(out_root, manifest)
+    return moved
+
+
 # Optional training, guarded import
 def _maybe_import_ultralytics():
     try:
@@ -182,6 +351,72 @@ def stratified_split_by_image(df: pd.DataFrame, seed: int, ratios=(0.7, 0.2, 0.1
         "test": images[n_train + n_val:],
     }
 
+SIZE_INDEX_NAME = ".image_sizes.json"
+
+def read_image_sizes(paths: List[Path], index_path: Path, workers: int = 8) -> Dict[str, Tuple[int, int]]:
+    """
+    Image sizes from headers only, read in a thread pool and cached in a sidecar JSON index.
+    Entries are keyed by path and reused while file size and mtime are unchanged.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    index: Dict[str, list] = {}
+    if index_path.exists():
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+
+    sizes: Dict[str, Tuple[int, int]] = {}
+    todo = []
+    for p in paths:
+        st = p.stat()
+        e = index.get(str(p))
+        if e and e[2] == st.st_mtime_ns and e[3] == st.st_size:
+            sizes[str(p)] = (int(e[0]), int(e[1]))
+        else:
+            todo.append((p, st))
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+            for (p, st), (w, h) in zip(todo, ex.map(read_image_size_fast, [p for p, _ in todo])):
+                sizes[str(p)] = (w, h)
+                index[str(p)] = [w, h, st.st_mtime_ns, st.st_size]
+        tmp = index_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        tmp.replace(index_path)
+    return sizes
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    if dst.exists():
+        return
+    try:
+        # same filesystem, no bytes copied
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def _class_ids(classes: pd.Series, class_map: Dict[str, int]) -> np.ndarray:
+    # Resolve each distinct class once, then map the whole column
+    lookup = {}
+    for k in classes.astype(str).unique():
+        if k in class_map:
+            lookup[k] = class_map[k]
+            continue
+        # Try stringifying everything to map
+        try:
+            alt = str(int(float(k)))
+        except ValueError:
+            alt = None
+        if alt not in class_map:
+            raise ValueError(f"Class {k} not in class_map")
+        lookup[k] = class_map[alt]
+    return classes.astype(str).map(lookup).to_numpy(dtype=np.int64)
+
+def _col(df: pd.DataFrame, name: str) -> np.ndarray:
+    if name not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)
+
 def write_yolo_dataset(
     df: pd.DataFrame,
     image_root: Path,
@@ -189,7 +424,15 @@ def write_yolo_dataset(
     class_map: Dict[str, int],
     seed: int,
     ratios=(0.7, 0.2, 0.1),
+    workers: int = 8,
 ) -> Dict[str, int]:
+    """
+    Writes the YOLO layout from a box table. Normalization, clipping and degenerate-box filtering
+    run on whole columns, image sizes come from read_image_sizes, and label files plus image
+    hardlinks (copy when linking fails) are written from a thread pool.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
     ensure_dir(out_root)
     splits = stratified_split_by_image(df, seed, ratios)
 
@@ -203,76 +446,85 @@ def write_yolo_dataset(
         ensure_dir(folders[split]["images"])
         ensure_dir(folders[split]["labels"])
 
-    # Index rows by image for efficient loop
-    by_image = {img: rows for img, rows in df.groupby("image_path")}
-    stats = {"train": 0, "val": 0, "test": 0}
-
+    # Resolve each image once, skip missing
+    src_of: Dict[str, Path] = {}
+    split_of: Dict[str, str] = {}
     for split, img_list in splits.items():
         for rel_img in img_list:
             src_img = (image_root / rel_img).resolve() if not Path(rel_img).is_absolute() else Path(rel_img)
             if not src_img.exists():
                 # Try fallback: if rel path already absolute-ish in parquet, keep as is
                 src_img = Path(rel_img)
-            if not src_img.exists():
-                # Skip missing
-                continue
-
-            # Copy image
-            dst_img = folders[split]["images"] / src_img.name
-            if not dst_img.exists():
-                shutil.copy2(src_img, dst_img)
-
-            # Build label file
-            rows = by_image.get(rel_img)
-            if rows is None or len(rows) == 0:
-                # no annotations, write empty file so YOLO does not crash
-                (folders[split]["labels"] / (dst_img.stem + ".txt")).write_text("")
-                continue
-
-            # Determine if boxes already normalized
-            normalized = bool(rows["normalized"].iloc[0]) if "normalized" in rows.columns else False
-
-            # Get image size once if needed
-            if normalized:
-                w, h = None, None
-            else:
-                w, h = read_image_size_fast(src_img)
-
-            lines = []
-            for _, r in rows.iterrows():
-                # Class id mapping
-                cls_key = str(r["class"])
-                if cls_key not in class_map:
-                    # Try stringifying everything to map
-                    if str(int(r["class"])) in class_map:
-                        cls_key = str(int(r["class"]))
-                    else:
-                        raise ValueError(f"Class {r['class']} not in class_map")
-                cls_id = class_map[cls_key]
-
-                if normalized:
-                    xc = float(r["x_center"])
-                    yc = float(r["y_center"])
-                    bw = float(r["width"])
-                    bh = float(r["height"])
-                else:
-                    xc, yc, bw, bh = yolo_box_from_abs(r["xmin"], r["ymin"], r["xmax"], r["ymax"], w, h)
-
-                # Clip to [0,1] to avoid format issues
-                xc = float(np.clip(xc, 0, 1))
-                yc = float(np.clip(yc, 0, 1))
-                bw = float(np.clip(bw, 0, 1))
-                bh = float(np.clip(bh, 0, 1))
-
-                # Skip degenerate boxes
-                if bw <= 0 or bh <= 0:
-                    continue
-
-                lines.append(f"{cls_id} {xc:.6f} {yc:.6f} {bw:.6f} {bh:.6f}")
+            if src_img.exists():
+                src_of[rel_img] = src_img
+                split_of[rel_img] = split
+
+    df = df.assign(_img=df["image_path"].astype(str))
+    df = df[df["_img"].isin(src_of.keys())]
+
+    # Determine if boxes already normalized, first row of each image decides like before
+    if "normalized" in df.columns:
+        norm = df.groupby("_img")["normalized"].transform("first").astype(bool).to_numpy()
+    else:
+        norm = np.zeros(len(df), dtype=bool)
+
+    xc, yc = _col(df, "x_center"), _col(df, "y_center")
+    bw, bh = _col(df, "width"), _col(df, "height")
+
+    if (~norm).any():
+        abs_imgs = pd.unique(df["_img"].to_numpy()[~norm])
+        sizes = read_image_sizes([src_of[k] for k in abs_imgs], out_root / SIZE_INDEX_NAME, workers)
+        w_of = pd.Series({k: sizes[str(src_of[k])][0] for k in abs_imgs}, dtype=np.float64)
+        h_of = pd.Series({k: sizes[str(src_of[k])][1] for k in abs_imgs}, dtype=np.float64)
+        iw = df["_img"].map(w_of).to_numpy(dtype=np.float64)
+        ih = df["_img"].map(h_of).to_numpy(dtype=np.float64)
+
+        xmin, ymin = _col(df, "xmin"), _col(df, "ymin")
+        xmax, ymax = _col(df, "xmax"), _col(df, "ymax")
+        abw = np.maximum(0.0, xmax - xmin)
+        abh = np.maximum(0.0, ymax - ymin)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            xc = np.where(norm, xc, (xmin + abw / 2.0) / iw)
+            yc = np.where(norm, yc, (ymin + abh / 2.0) / ih)
+            bw = np.where(norm, bw, abw / iw)
+            bh = np.where(norm, bh, abh / ih)
+
+    # Clip to [0,1] to avoid format issues, skip degenerate and unparseable boxes
+    xc, yc, bw, bh = (np.clip(a, 0, 1) for a in (xc, yc, bw, bh))
+    keep = (bw > 0) & (bh > 0)
+
+    boxes = pd.DataFrame({
+        "_img": df["_img"].to_numpy()[keep],
+        "cls": _class_ids(df["class"], class_map)[keep],
+        "xc": xc[keep], "yc": yc[keep], "bw": bw[keep], "bh": bh[keep],
+    }).sort_values("_img", kind="mergesort")
+
+    # Format every line in one pass, then slice per image
+    text = boxes[["cls", "xc", "yc", "bw", "bh"]].to_csv(
+        sep=" ", header=False, index=False, float_format="%.6f", lineterminator="\n"
+    )
+    lines = text.split("\n")[:-1] if text else []
+    imgs = boxes["_img"].to_numpy()
+    uniq, first = np.unique(imgs, return_index=True)
+    bounds = dict(zip(uniq, zip(first, np.append(first[1:], len(imgs)))))
 
-            label_path = folders[split]["labels"] / (dst_img.stem + ".txt")
-            label_path.write_text("\n".join(lines))
-            stats[split] += len(lines)
+    stats = {"train": 0, "val": 0, "test": 0}
+    jobs = []
+    for rel_img, src_img in src_of.items():
+        split = split_of[rel_img]
+        dst_img = folders[split]["images"] / src_img.name
+        a, b = bounds.get(rel_img, (0, 0))
+        # no annotations still gets an empty file so YOLO does not crash
+        jobs.append((src_img, dst_img, folders[split]["labels"] / (dst_img.stem + ".txt"), "\n".join(lines[a:b])))
+        stats[split] += int(b - a)
+
+    def _write(job) -> None:
+        src_img, dst_img, label_path, body = job
+        _link_or_copy(src_img, dst_img)
+        label_path.write_text(body)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        list(ex.map(_write, jobs))
 
     return stats
 
@@ -287,18 +539,120 @@ def write_yolo_data_yaml(out_root: Path, names: Dict[int, str], file_path: Path)
     with open(file_path, "w", encoding="utf-8") as f:
         yaml.safe_dump(content, f, sort_keys=False)
 
-def maybe_train(cfg: Dict, data_yaml_path: Path) -> None:
+# ---------- Training cache and serving sweep ----------
+
+def _resize_for_cache(job: Tuple[str, str, int]) -> None:
+    src, dst, imgsz = job
+    with Image.open(src) as im:
+        # JPEG draft decodes straight at a reduced DCT scale, far cheaper than a full decode
+        im.draft("RGB", (imgsz, imgsz))
+        im = im.convert("RGB")
+        r = imgsz / max(im.size)
+        if r < 1.0:
+            im = im.resize((max(1, round(im.width * r)), max(1, round(im.height * r))), Image.BILINEAR)
+        im.save(dst, format="JPEG", quality=95)
+
+def build_resized_cache(data_yaml_path: Path, imgsz: int, cache_root: Path, workers: int = 4) -> Path:
+    """
+    Writes a copy of the dataset with every image's long side at imgsz, the size Ultralytics
+    resizes to on load, so epochs decode small JPEGs. Aspect ratio is kept and no padding is
+    added, so normalized labels stay valid and are hardlinked as-is, Ultralytics letterboxes
+    at train time. Returns the data yaml of the cache.
+
+    A cached image is rewritten when its source path, size, mtime or imgsz differ from the
+    cache manifest. Cached images and labels whose stem is no longer in the source split are
+    deleted, so an image a resplit moved from train to val does not stay in both.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    with open(data_yaml_path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    src_root = Path(data.get("path") or data_yaml_path.parent)
+
+    manifest_path = cache_root / CACHE_MANIFEST_NAME
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            old = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        old = {}
+    manifest: Dict[str, list] = {}
+
+    jobs = []
+    removed = 0
+    for split in ["train", "val", "test"]:
+        rel = data.get(split)
+        if not rel or not (src_root / rel).is_dir():
+            continue
+        src_img_dir = src_root / rel
+        src_lbl_dir = src_img_dir.parent / "labels"
+        dst_img_dir = cache_root / rel
+        dst_lbl_dir = dst_img_dir.parent / "labels"
+        ensure_dir(dst_img_dir)
+        ensure_dir(dst_lbl_dir)
+        stems, labeled = set(), set()
+        for src in src_img_dir.iterdir():
+            if not src.is_file():
+                continue
+            stems.add(src.stem)
+            dst = dst_img_dir / (src.stem + ".jpg")
+            st = src.stat()
+            sig = [str(src), st.st_size, st.st_mtime_ns, int(imgsz)]
+            key = dst.relative_to(cache_root).as_posix()
+            if not dst.exists() or old.get(key) != sig:
+                jobs.append((str(src), str(dst), int(imgsz)))
+            manifest[key] = sig
+            lbl = src_lbl_dir / (src.stem + ".txt")
+            if lbl.exists():
+                labeled.add(src.stem)
+                dst_lbl = dst_lbl_dir / lbl.name
+                if dst_lbl.exists():
+                    dst_lbl.unlink()
+                _link_or_copy(lbl, dst_lbl)
+
+        # images and labels that left this split or the dataset
+        for p in list(dst_img_dir.iterdir()):
+            if p.is_file() and p.stem not in stems:
+                p.unlink()
+                removed += 1
+        for p in list(dst_lbl_dir.iterdir()):
+            if p.is_file() and p.suffix == ".txt" and p.stem not in labeled:
+                p.unlink()
+
+    if removed:
+        print(f"Resized cache: removed {removed} images no longer in their split")
+    print(f"Resized cache: {len(jobs)} images to write at imgsz {imgsz}")
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            list(ex.map(_resize_for_cache, jobs, chunksize=64))
+    else:
+        for job in jobs:
+            _resize_for_cache(job)
+
+    # written only once every image is in place, an interrupted run redoes its jobs
+    tmp = manifest_path.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, sort_keys=True)
+    tmp.replace(manifest_path)
+
+    cache_yaml = cache_root / data_yaml_path.name
+    write_yolo_data_yaml(out_root=cache_root, names=data.get("names") or {}, file_path=cache_yaml)
+    return cache_yaml
+
+def maybe_train(cfg: Dict, data_yaml_path: Path) -> Path:
+    """
+    Returns the weights to evaluate, the trained best.pt or train.base when training is off.
+    """
     train_cfg = cfg.get("train", {})
+    base = train_cfg.get("base", "yolov8n.pt")
     if not bool(train_cfg.get("enabled", False)):
         print("Training disabled. Skipping YOLOv8 train step.")
-        return
+        return Path(base)
 
     YOLO = _maybe_import_ultralytics()
     if YOLO is None:
         print("Ultralytics not installed. Run: pip install ultralytics torch torchvision")
-        return
+        return Path(base)
 
-    base = train_cfg.get("base", "yolov8n.pt")
     device = str(train_cfg.get("device", "0"))
     imgsz = int(train_cfg.get("imgsz", 640))
     epochs = int(train_cfg.get("epochs", 100))
@@ -310,6 +664,12 @@ def maybe_train(cfg: Dict, data_yaml_path: Path) -> None:
     mixup = float(train_cfg.get("mixup", 0.0))
     patience = int(train_cfg.get("patience", 15))
 
+    if bool(train_cfg.get("cache_resized", False)):
+        proj_root = Path(cfg.get("project_root", ".")).resolve()
+        cache_root = proj_root / train_cfg.get("cache_dir", f"{cfg['data']['output_dataset_dir']}_{imgsz}")
+        data_yaml_path = build_resized_cache(data_yaml_path, imgsz, cache_root, workers=workers)
+        print(f"Training on resized cache {data_yaml_path}")
+
     model = YOLO(base)
     print("Starting YOLOv8 training")
     model.train(
@@ -326,6 +686,107 @@ def maybe_train(cfg: Dict, data_yaml_path: Path) -> None:
         patience=patience,
         exist_ok=True,
     )
+    return Path(project) / name / "weights" / "best.pt"
+
+def _pareto_front(rows: List[Dict]) -> List[Dict]:
+    # Keep configs no other config beats on both latency and mAP
+    front = []
+    for r in rows:
+        dominated = any(
+            o["latency_ms"] <= r["latency_ms"] and o["map50_95"] >= r["map50_95"]
+            and (o["latency_ms"] < r["latency_ms"] or o["map50_95"] > r["map50_95"])
+            for o in rows
+        )
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: r["latency_ms"])
+
+def _cpu_latency_ms(model, images: List[Path], imgsz: int, warmup: int = 3) -> float:
+    import time
+    for p in images[:warmup]:
+        model.predict(str(p), imgsz=imgsz, device="cpu", verbose=False)
+    times = []
+    for p in images:
+        t0 = time.perf_counter()
+        model.predict(str(p), imgsz=imgsz, device="cpu", verbose=False)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return float(np.median(times))
+
+def sweep_detector(
+    weights: Path,
+    data_yaml_path: Path,
+    imgsz_list: List[int],
+    formats: List[str],
+    report_path: Path,
+    n_latency_images: int = 50,
+    export_dir: Path = None,
+) -> List[Dict]:
+    """
+    Measures mAP and median CPU latency per image for each (format, imgsz) pair and writes a
+    JSON report with all rows and the Pareto front, to pick the lp_detector.py serving config.
+    formats are Ultralytics export names, "pytorch" means the .pt weights as-is.
+    Each export goes to its own export_dir/<format>-<imgsz> folder (default next to the report),
+    the weights folder is never written to.
+    """
+    YOLO = _maybe_import_ultralytics()
+    if YOLO is None:
+        print("Ultralytics not installed. Skipping detector sweep.")
+        return []
+
+    with open(data_yaml_path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    val_dir = Path(data.get("path") or data_yaml_path.parent) / data["val"]
+    images = sorted(p for p in val_dir.iterdir() if p.is_file())[:n_latency_images]
+
+    export_dir = Path(export_dir) if export_dir else report_path.parent / "sweep_exports"
+    rows = []
+    for fmt in formats:
+        for imgsz in imgsz_list:
+            if fmt == "pytorch":
+                model_path = str(weights)
+            else:
+                # Ultralytics exports next to the weights it loaded, so load a copy in a folder of its own
+                run_dir = export_dir / f"{fmt}-{imgsz}"
+                run_dir.mkdir(parents=True, exist_ok=True)
+                local = run_dir / weights.name
+                shutil.copy2(weights, local)
+                model_path = YOLO(str(local)).export(format=fmt, imgsz=imgsz)
+            model = YOLO(model_path, task="detect")
+            metrics = model.val(data=str(data_yaml_path), imgsz=imgsz, device="cpu", verbose=False)
+            row = {
+                "format": fmt,
+                "imgsz": int(imgsz),
+                "model_path": str(model_path),
+                "map50": float(metrics.box.map50),
+                "map50_95": float(metrics.box.map),
+                "latency_ms": _cpu_latency_ms(model, images, imgsz),
+            }
+            print(f"  {fmt:>10} imgsz={imgsz:<5} mAP50-95={row['map50_95']:.4f} latency={row['latency_ms']:.1f} ms")
+            rows.append(row)
+
+    front = _pareto_front(rows)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"weights": str(weights), "rows": rows, "pareto": front}, f, indent=2)
+    print(f"Wrote detector sweep report to {report_path}")
+    for r in front:
+        print(f"  pareto: {r['format']} imgsz={r['imgsz']} mAP50-95={r['map50_95']:.4f} latency={r['latency_ms']:.1f} ms")
+    return rows
+
+def maybe_sweep(cfg: Dict, data_yaml_path: Path, weights: Path) -> None:
+    sweep_cfg = cfg.get("sweep", {})
+    if not bool(sweep_cfg.get("enabled", False)):
+        return
+    proj_root = Path(cfg.get("project_root", ".")).resolve()
+    sweep_detector(
+        weights=Path(sweep_cfg.get("weights") or weights),
+        data_yaml_path=data_yaml_path,
+        imgsz_list=[int(x) for x in sweep_cfg.get("imgsz", [320, 480, 640])],
+        formats=list(sweep_cfg.get("formats", ["pytorch", "onnx"])),
+        report_path=proj_root / sweep_cfg.get("report", "lp-det/sweep_report.json"),
+        n_latency_images=int(sweep_cfg.get("latency_images", 50)),
+        export_dir=proj_root / sweep_cfg["export_dir"] if sweep_cfg.get("export_dir") else None,
+    )
 
 def main():
     ap = argparse.ArgumentParser()
@@ -346,6 +807,7 @@ def main():
         repo_id = cfg["data"].get("hf_repo_id", "jtatman/license-plate-finetuning")
         split_map = cfg["data"].get("hf_split_map", {"train": "train", "val": "validation"})
         class_name = cfg["data"].get("class_name", "license-plate")
+        incremental = bool(cfg["data"].get("incremental", False))
 
         print(f"Exporting HF dataset {repo_id} to YOLO folder at {out_root}")
         yolo_yaml = export_hf_parquet_to_yolo(
@@ -353,12 +815,30 @@ def main():
             out_root=out_root,
             split_map=split_map,
             class_name=class_name,
+            streaming=bool(cfg["data"].get("hf_streaming", False)),
+            workers=int(cfg["data"].get("export_workers", 0)),
+            incremental=incremental,
         )
         print(f"Wrote YOLO data yaml to {yolo_yaml}")
 
         # Optional manual resplit
         force_resplit = bool(cfg["data"].get("force_resplit", False))
-        if force_resplit:
+        if incremental:
+            # Place every sample by renames, either on its hash split or back on its source split
+            ratios = tuple(cfg["data"].get("splits", [0.7, 0.2, 0.1]))
+            seed = int(cfg["data"].get("seed", 1337))
+            manifest = load_manifest(out_root)
+            if force_resplit:
+                targets = {h: split_for_hash(h, seed, ratios) for h in manifest}
+            else:
+                targets = {h: e["source_split"] for h, e in manifest.items()}
+            moved = place_manifest_items(out_root, manifest, targets)
+            print(f"Placed samples by manifest, {moved} moved")
+            if force_resplit:
+                yolo_yaml = out_root / "license_plate.yaml"
+                write_yolo_data_yaml(out_root=out_root, names={0: class_name}, file_path=yolo_yaml)
+                print(f"Rewrote YOLO yaml with test split at {yolo_yaml}")
+        elif force_resplit:
             # Merge current train and val, then re-split by images
             print("Force re-splitting to 70,20,10 by image")
             # Load labels for both splits and reconstruct a small index
@@ -388,43 +868,35 @@ def main():
                 "test": images[n_train + n_val:],
             }
 
-            # Nuke old layout and rebuild folders
+            # Move the old layout aside, then rename files into the new split folders, no bytes are copied
+            staging = out_root / "_resplit_src"
+            if staging.exists():
+                shutil.rmtree(staging)
+            staging.mkdir(parents=True)
             for split in ["train", "val", "test"]:
+                if (out_root / split).exists():
+                    (out_root / split).replace(staging / split)
                 for sub in ["images", "labels"]:
-                    p = out_root / split / sub
-                    if p.exists():
-                        shutil.rmtree(p)
-                    p.mkdir(parents=True, exist_ok=True)
+                    (out_root / split / sub).mkdir(parents=True, exist_ok=True)
 
-            # Reuse labels by name, copy images accordingly
             # Labels live only for original train and val
-            old_lbl = {
-                "train": out_root / "train" / "labels",
-                "val": out_root / "val" / "labels",
-            }
-            old_img = {
-                "train": out_root / "train" / "images",
-                "val": out_root / "val" / "images",
-            }
-
-            def find_source(stem):
-                if (old_lbl["train"] / f"{stem}.txt").exists():
-                    return "train"
-                if (old_lbl["val"] / f"{stem}.txt").exists():
-                    return "val"
-                return None
-
             for split, img_list in new.items():
                 for img_path in img_list:
                     img_path = Path(img_path)
                     stem = img_path.stem
-                    src_split = find_source(stem)
-                    if src_split is None:
+                    src_split = img_path.parent.parent.name
+                    src_lbl = staging / src_split / "labels" / f"{stem}.txt"
+                    if not src_lbl.exists():
                         continue
-                    # copy image
-                    shutil.copy2(img_path, out_root / split / "images" / img_path.name)
-                    # copy label
-                    shutil.copy2(old_lbl[src_split] / f"{stem}.txt", out_root / split / "labels" / f"{stem}.txt")
+                    # train and val both number from 0, keep both when stems collide
+                    dst_stem = stem
+                    if (out_root / split / "labels" / f"{stem}.txt").exists():
+                        dst_stem = f"{src_split}_{stem}"
+                    (staging / src_split / "images" / img_path.name).replace(
+                        out_root / split / "images" / f"{dst_stem}{img_path.suffix}"
+                    )
+                    src_lbl.replace(out_root / split / "labels" / f"{dst_stem}.txt")
+            shutil.rmtree(staging)
 
             # Rewrite yaml with test
             names = {0: class_name}
@@ -440,7 +912,8 @@ def main():
             print(f"Rewrote YOLO yaml with test split at {yolo_yaml}")
 
         # Optional training
-        maybe_train(cfg, yolo_yaml)
+        weights = maybe_train(cfg, yolo_yaml)
+        maybe_sweep(cfg, yolo_yaml, weights)
         return
 
     # Fallback to your original local parquet flow
@@ -478,6 +951,7 @@ def main():
         class_map=class_map_cfg,
         seed=seed,
         ratios=ratios,
+        workers=int(cfg["data"].get("io_workers", 8)),
     )
 
     print("Written label counts by split:")
@@ -490,7 +964,8 @@ def main():
     write_yolo_data_yaml(out_root=out_root, names=names, file_path=data_yaml_path)
     print(f"Wrote YOLO data yaml to {data_yaml_path}")
 
-    maybe_train(cfg, data_yaml_path)
+    weights = maybe_train(cfg, data_yaml_path)
+    maybe_sweep(cfg, data_yaml_path, weights)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
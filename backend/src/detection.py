@@ -1,46 +1,253 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
+import hashlib
+import time
 import numpy as np
 
 # New-style modules that work on in-memory images
-from .lp_detector import detect_license_plates
-from .ocr import find_text_pii
 from .redactor import apply_redactions
+from .detection_store import DetectionStore, model_version
+from .tiling import should_tile, process_image_tiled, detect_tiled, split_tiled_ms
+from .near_dup import get_near_dup_index, covered
+from .registry import run_detectors, run_candidates, select_candidates
+from .model_registry import record_versions
+from .scene_gate import get_scene_gate
+
+
+def image_hash(img_rgb: np.ndarray) -> str:
+    """
+    Stable content hash of a decoded image, shape included so a reshape never collides.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(img_rgb.shape).encode("ascii"))
+    h.update(np.ascontiguousarray(img_rgb).data)
+    return h.hexdigest()
+
+
+# ---------- Detection phase and render phase ----------
+
+def detect_candidates(img_rgb: np.ndarray, cfg: dict, skip: Optional[set] = None) -> Dict[str, Any]:
+    """
+    Runs every enabled detector once with no policy applied (registry.run_candidates), a gate
+    branch in skip yields no items.
+    Returns {"detectors": {name: [...]}, "timings_ms": {name: ms}}, see
+    detect_license_plate_candidates and find_text_candidates for the built-in item layouts.
+    """
+    items, timings = run_candidates(img_rgb, cfg, skip=skip)
+    return {"detectors": items, "timings_ms": timings}
+
+
+def select_boxes(candidates: Dict[str, Any], cfg: dict) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Applies the current policy to stored candidates, returns (lp_boxes, pii_boxes).
+    Each detector's select uses the same keys as the direct path, e.g. lp.score_threshold,
+    ocr.min_confidence, pii.min_score and pii.entities.
+    """
+    boxes = select_candidates(candidates.get("detectors", {}), cfg)
+    lp_boxes = boxes.pop("license_plate", [])
+    pii_boxes = [b for found in boxes.values() for b in found]
+    return lp_boxes, pii_boxes
 
 
 # ---------- Single-image path for the mobile POST /process ----------
 
-def process_image_np(img_rgb: np.ndarray, cfg: dict) -> Tuple[np.ndarray, Dict[str, Any], bool]:
+def _split_found(
+    found: Dict[str, List[Any]], det_ms: Dict[str, float]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, Any]]:
+    # run_detectors output as (lp_boxes, pii_boxes, detectors meta)
+    lp_boxes = [b.to_dict() for b in found.get("license_plate", [])]
+    pii_boxes = [b.to_dict() for name, boxes in found.items() if name != "license_plate" for b in boxes]
+    detectors = {name: {"boxes": len(boxes), "ms": det_ms[name]} for name, boxes in found.items()}
+    return lp_boxes, pii_boxes, detectors
+
+
+def _near_dup_hint(
+    img_rgb: np.ndarray, cfg: dict, index, sig
+) -> Optional[Tuple[Optional[List[Dict[str, Any]]], Dict[str, List[Any]], Dict[str, float], int]]:
+    """
+    Checks a near-duplicate hit by re-running every detector but the plate one.
+    None on a miss, else (lp_boxes, found, det_ms, distance) with the fresh run_detectors output.
+    lp_boxes are the reused plate boxes when the fresh text boxes lie inside the reused ones,
+    None when the text changed, then only the plate detector is left to run.
+    """
+    near = index.lookup(img_rgb, sig)
+    if near is None:
+        return None
+    found, det_ms = run_detectors(img_rgb, cfg, skip={"lp"})
+    pii_boxes = [b.to_dict() for boxes in found.values() for b in boxes]
+    if not covered(pii_boxes, near[1]):
+        index.rejected += 1
+        return None, found, det_ms, near[2]
+    return near[0], found, det_ms, near[2]
+
+
+def detect_image_np(
+    img_rgb: np.ndarray, cfg: dict, store: Optional[DetectionStore] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Detection half of process_image_np, nothing is redacted or encoded.
+    Returns (lp_boxes, pii_boxes, meta), meta carries everything but the redaction timings.
+
+    With a DetectionStore, raw candidates are looked up by image hash and model version first,
+    so a policy change only re-runs the render step.
+    With near_dup enabled, a recent near-identical image is a hint: text detectors re-run, and
+    its plate boxes are reused only when the fresh text boxes are covered by its text boxes,
+    otherwise the fresh text boxes are kept and only the plate detector runs.
+    With scene_gate on, the plate or text branch is skipped when the image cannot match it.
+    A degraded cfg["tier"] (see scheduler.tier_config) bypasses the store and is not added to
+    the index, so cheaper results are never served to a full-tier request.
+    """
+    if img_rgb.ndim != 3 or img_rgb.shape[2] != 3:
+        raise ValueError(f"Expected HxWx3 RGB, got shape {img_rgb.shape}")
+
+    # meta["models"] lists the versions this request was served by, not all loaded models
+    with record_versions() as used:
+        lp_boxes, pii_boxes, meta = _detect_image_np(img_rgb, cfg, store)
+    meta["models"] = used
+    return lp_boxes, pii_boxes, meta
+
+
+def _detect_image_np(
+    img_rgb: np.ndarray, cfg: dict, store: Optional[DetectionStore]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, Any]]:
+    tier = cfg.get("tier", "full")
+    if tier != "full":
+        store = None
+
+    t0 = time.perf_counter()
+    img_hash = image_hash(img_rgb)
+    version: Optional[str] = None
+    cached = False
+    near = None
+    tiling = None
+    detectors = None
+
+    gate = get_scene_gate(cfg)
+    gate_decision: Optional[Dict[str, Any]] = None
+
+    # tiled images skip the store and near-dup index, neither is built for images this size
+    tiled = should_tile(img_rgb, cfg)
+    index = get_near_dup_index(cfg) if not tiled else None
+    sig = index.signature(img_rgb) if index is not None else None
+    if index is not None:
+        near = _near_dup_hint(img_rgb, cfg, index, sig)
+    reused = near is not None and near[0] is not None
+
+    if reused:
+        print("Reusing plate boxes of a near-duplicate")
+        lp_boxes, found, det_ms, _ = near
+        _, pii_boxes, detectors = _split_found(found, det_ms)
+        t1, t2 = t0, time.perf_counter()
+    elif tiled:
+        lp_boxes, pii_boxes, tiling = detect_tiled(img_rgb, cfg)
+        t2 = time.perf_counter()
+        t1 = t0 + split_tiled_ms(tiling, (t2 - t0) * 1000.0)[0] / 1000.0
+    elif store is not None and near is None:
+        version = model_version(cfg)
+        candidates = store.get(img_hash, version)
+        cached = candidates is not None
+        if candidates is None:
+            print("Detecting candidates")
+            gate_decision = gate.check(img_rgb) if gate is not None else None
+            run = gate_decision or {"lp": True, "text": True}
+            with record_versions() as used:
+                candidates = detect_candidates(img_rgb, cfg, skip={k for k in ("lp", "text") if not run[k]})
+            # keyed by the models that ran, a reload may have swapped them since the lookup
+            version = model_version(cfg, used)
+            store.put(img_hash, version, candidates)
+        lp_boxes, pii_boxes = select_boxes(candidates, cfg)
+        # stage times of a cached record are zero, the lookup is counted under pii
+        t1 = t0 if cached else t0 + candidates["timings_ms"].get("license_plate", 0.0) / 1000.0
+        t2 = time.perf_counter()
+    else:
+        gate_decision = gate.check(img_rgb) if gate is not None else None
+        run = gate_decision or {"lp": True, "text": True}
+
+        if near is not None:
+            # the rejected hint already re-ran the text detectors, only plates are left
+            print("Near-duplicate text changed, running the plate detector")
+            _, found, det_ms, _ = near
+            found, det_ms = dict(found), dict(det_ms)
+            if run["lp"]:
+                lp_found, lp_ms = run_detectors(img_rgb, cfg, gates={"lp"})
+                found.update(lp_found)
+                det_ms.update(lp_ms)
+        else:
+            # every registered detector on its shared view, in parallel
+            print("Running detectors")
+            found, det_ms = run_detectors(img_rgb, cfg, skip={k for k in ("lp", "text") if not run[k]})
+        lp_boxes, pii_boxes, detectors = _split_found(found, det_ms)
+        # the branches overlap, lp keeps its own time and pii gets the rest of the wall time
+        t1 = t0 + det_ms.get("license_plate", 0.0) / 1000.0
+        t2 = time.perf_counter()
+
+    if gate_decision is not None and gate.mode == "shadow":
+        gate.record(gate_decision, len(lp_boxes), len(pii_boxes))
+
+    if index is not None and not reused and tier == "full":
+        index.add(img_rgb, lp_boxes, pii_boxes, sig)
+
+    meta = {
+        "image_hash": img_hash,
+        "tier": tier,
+        "model_version": version,
+        "detections_cached": cached,
+        "near_duplicate_distance": near[3] if reused else None,
+        "tiling": tiling,
+        "scene_gate": gate_decision,
+        "detectors": detectors,
+        "boxes": lp_boxes + pii_boxes,
+        "counts": {
+            "license_plates": len(lp_boxes),
+            "pii": len(pii_boxes),
+            "total": len(lp_boxes) + len(pii_boxes),
+        },
+        "timings_ms": {
+            "lp": (t1 - t0) * 1000.0,
+            "pii": (t2 - t1) * 1000.0,
+            "total": (t2 - t0) * 1000.0,
+        },
+    }
+    return lp_boxes, pii_boxes, meta
+
+
+def process_image_np(
+    img_rgb: np.ndarray, cfg: dict, store: Optional[DetectionStore] = None, inplace: bool = False
+) -> Tuple[np.ndarray, Dict[str, Any], bool]:
     """
     Accepts an RGB ndarray (H, W, 3), dtype uint8.
     Returns redacted RGB ndarray, metadata dict, and 'applied' flag.
+    With inplace the boxes are drawn into img_rgb itself and it is returned, e.g. a shared
+    memory slot (the tiled path still returns its own memmap).
+
+    Detection goes through detect_image_np. Images above cfg["tiling"]["min_pixels"] go through
+    process_image_tiled when tiling is enabled, so redaction is also done tile by tile.
     """
     print("PROCESSING IMAGE.......")
     if img_rgb.ndim != 3 or img_rgb.shape[2] != 3:
         raise ValueError(f"Expected HxWx3 RGB, got shape {img_rgb.shape}")
 
-    # 1) license plates
-    print("Detecting License Plates")
-    lp_boxes = detect_license_plates(img_rgb, cfg)
+    if should_tile(img_rgb, cfg):
+        with record_versions() as used:
+            redacted_rgb, meta, applied = process_image_tiled(img_rgb, cfg)
+        meta["image_hash"] = image_hash(img_rgb)
+        meta["tier"] = cfg.get("tier", "full")
+        meta["models"] = used
+        return redacted_rgb, meta, applied
 
-    # 2) PII text
-    print("Detecting text PII")
-    pii_boxes = find_text_pii(img_rgb, cfg)
+    lp_boxes, pii_boxes, meta = detect_image_np(img_rgb, cfg, store=store)
 
     # 3) merge and redact
     print("Redacting..")
+    t2 = time.perf_counter()
     all_boxes: List[Dict[str, Any]] = lp_boxes + pii_boxes
-    redacted_rgb, applied = apply_redactions(img_rgb, all_boxes, cfg)
+    redacted_rgb, applied = apply_redactions(img_rgb, all_boxes, cfg, inplace=inplace)
 
     # normalize result
-    redacted_rgb = np.clip(redacted_rgb, 0, 255).astype(np.uint8)
+    if redacted_rgb.dtype != np.uint8:
+        redacted_rgb = np.clip(redacted_rgb, 0, 255).astype(np.uint8)
+    redact_ms = (time.perf_counter() - t2) * 1000.0
 
-    meta = {
-        "boxes": all_boxes,
-        "counts": {
-            "license_plates": len(lp_boxes),
-            "pii": len(pii_boxes),
-            "total": len(all_boxes),
-        }
-    }
-    return redacted_rgb, meta, applied
\ No newline at end of file
+    meta["timings_ms"]["redact"] = redact_ms
+    meta["timings_ms"]["total"] += redact_ms
+    return redacted_rgb, meta, applied
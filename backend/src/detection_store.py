@@ -0,0 +1,111 @@
+from typing import Dict, Any, Optional
+import hashlib
+import json
+import os
+
+from .scene_gate import get_scene_gate
+from .ocr_preprocess import preprocess_signature
+from .model_registry import file_checksum, get_model_registry, model_label
+
+# Bump when the candidate record layout changes, old records are then ignored
+SCHEMA_VERSION = 2
+
+
+def _file_sig(path: Optional[str]) -> str:
+    if not path or not os.path.isfile(path):
+        return f"{path}:missing"
+    # same content hash the model registry versions YOLO by
+    return f"{os.path.basename(path)}:{file_checksum(path)}"
+
+
+def _loaded_sig(kind: str, path: Optional[str], used: Optional[Dict[str, str]]) -> str:
+    # the version a run got from the registry, else the one it has loaded, not what is on disk
+    # now: new weights are only served after the hot reload swaps them in
+    version = (used or {}).get(model_label(kind, path or "")) or get_model_registry().loaded_version(kind, path or "")
+    if version is None:
+        return _file_sig(path)
+    return f"{os.path.basename(path or '')}:{version}"
+
+
+def model_version(cfg: Dict[str, Any], used: Optional[Dict[str, str]] = None) -> str:
+    """
+    Short id of the models and candidate settings that produced a detection record.
+    YOLO is identified by the version the model registry serves (a content checksum, so a
+    redeploy of identical files keeps the version). used, from record_versions around the
+    detection run, names the versions that produced a record about to be stored.
+    cfg["detections"]["model_version"] overrides it.
+    """
+    det_cfg = cfg.get("detections", {}) or {}
+    if det_cfg.get("model_version"):
+        return str(det_cfg["model_version"])
+
+    paths_cfg = cfg.get("paths") or {}
+    lp_cfg = cfg.get("lp", {}) or {}
+    parts = [
+        f"schema={SCHEMA_VERSION}",
+        "yolo=" + _loaded_sig("yolo", paths_cfg.get("yolo_weights"), used),
+        "onnx=" + _file_sig(os.getenv("ONNX_MODEL_PATH") or paths_cfg.get("onnx_model")),
+        f"floor={float(lp_cfg.get('candidate_floor', 0.05))}",
+        f"bgr={bool(lp_cfg.get('expects_bgr', False))}",
+        # records hold one item list per enabled detector
+        "detectors=" + ",".join((cfg.get("detectors", {}) or {}).get("enabled") or ["license_plate", "text_pii"]),
+    ]
+    # OCR preprocessing changes which words are found, default settings keep older versions valid
+    if preprocess_signature(cfg) != preprocess_signature({}):
+        parts.append("ocr=" + preprocess_signature(cfg))
+    # per-language analyzers and Tesseract packs find different words
+    ml = ((cfg.get("pii", {}) or {}).get("multilingual") or {})
+    if bool(ml.get("enabled", False)):
+        parts.append("langs=" + ",".join(f"{k}:{v}" for k, v in sorted((ml.get("models") or {}).items())))
+    # a gated record lacks the branches it skipped, so gate settings are part of the version
+    gate = get_scene_gate(cfg)
+    if gate is not None and gate.mode == "on":
+        parts.append("gate=" + gate.signature())
+    return hashlib.blake2b("|".join(parts).encode("utf-8"), digest_size=8).hexdigest()
+
+
+class DetectionStore:
+    """
+    Raw detection candidates on disk, one JSON file per image under root/<model_version>/<hash[:2]>/<hash>.json.
+    Writes go through a temp file and os.replace, so readers never see a partial record.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, image_hash: str, version: str) -> str:
+        return os.path.join(self.root, version, image_hash[:2], f"{image_hash}.json")
+
+    def get(self, image_hash: str, version: str) -> Optional[Dict[str, Any]]:
+        path = self._path(image_hash, version)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                rec = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if rec.get("schema") != SCHEMA_VERSION:
+            return None
+        return rec
+
+    def put(self, image_hash: str, version: str, candidates: Dict[str, Any]) -> None:
+        path = self._path(image_hash, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        rec = {"schema": SCHEMA_VERSION, "image_hash": image_hash, "model_version": version, **candidates}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rec, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+
+def build_detection_store(cfg: Dict[str, Any]) -> Optional[DetectionStore]:
+    """
+    Config keys supported under cfg["detections"]:
+      enabled: bool                 default False
+      dir: store folder             default backend/results/detections
+      model_version: str            optional override for model_version()
+    """
+    det_cfg = cfg.get("detections", {}) or {}
+    if not bool(det_cfg.get("enabled", False)):
+        return None
+    return DetectionStore(det_cfg.get("dir") or "backend/results/detections")
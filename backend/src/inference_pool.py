@@ -0,0 +1,337 @@
+from typing import Dict, Any, Optional, Callable, Tuple, List
+import os
+from multiprocessing import shared_memory
+import multiprocessing as mp
+import queue
+import threading
+import numpy as np
+
+from .resources import cpu_budget
+
+# ---------- Worker side, runs in the spawned inference processes ----------
+
+_W: Dict[str, Any] = {}
+
+
+def _init_worker(cfg: Dict[str, Any], shm_name: str, threads: int, reload_gen) -> None:
+    # Same split as the sweep workers: budget first, the model libraries read it on import
+    from .resources import apply_cpu_budget
+    cfg = dict(cfg)
+    cfg["cpu"] = dict(cfg.get("cpu") or {}, workers=1, cores=threads, pin=False)
+    apply_cpu_budget(cfg)
+
+    from .detection import process_image_np
+    from .detection_store import build_detection_store
+    from .model_registry import get_model_registry, start_hot_reload
+
+    _W["cfg"] = cfg
+    _W["tiers"] = {}
+    _W["process"] = process_image_np
+    _W["store"] = build_detection_store(cfg)
+    _W["shm"] = shared_memory.SharedMemory(name=shm_name)
+    _W["reload_gen"] = reload_gen
+    _W["seen_gen"] = reload_gen.value
+    _W["registry"] = get_model_registry()
+    if (cfg.get("models") or {}).get("preload", False):
+        get_model_registry().get("yolo", cfg["paths"]["yolo_weights"])
+        get_model_registry().get("analyzer", "")
+    start_hot_reload(cfg)
+
+
+def _worker_cfg(tier: Optional[str]) -> Dict[str, Any]:
+    if tier is None:
+        return _W["cfg"]
+    if tier not in _W["tiers"]:
+        from .scheduler import tier_config
+        _W["tiers"][tier] = tier_config(_W["cfg"], tier)
+    return _W["tiers"][tier]
+
+
+def _worker_stats() -> Dict[str, Any]:
+    from .near_dup import get_near_dup_index
+    from .scene_gate import get_scene_gate
+    from .lang_pool import get_analyzer_pool
+
+    cfg = _W["cfg"]
+    index, gate, pool = get_near_dup_index(cfg), get_scene_gate(cfg), get_analyzer_pool(cfg)
+    return {
+        "models": _W["registry"].versions(),
+        "near_dup": index.stats() if index is not None else None,
+        "scene_gate": gate.stats() if gate is not None else None,
+        "lang_pool": pool.stats() if pool is not None else None,
+    }
+
+
+def _run_slot(
+    offset: int, shape: Tuple[int, int, int], tier: Optional[str]
+) -> Tuple[Dict[str, Any], bool, int, Dict[str, Any]]:
+    """
+    Runs process_image_np on the image in the slot, redacting it in place in shared memory.
+    Only the offset, shape and tier come in; meta, the applied flag and a small snapshot of this
+    worker's models and stage counters go back.
+    """
+    gen = _W["reload_gen"].value
+    if gen != _W["seen_gen"]:
+        # POST /models/reload in the API process, checked here before the next image
+        _W["seen_gen"] = gen
+        _W["registry"].check()
+
+    img = np.ndarray(shape, dtype=np.uint8, buffer=_W["shm"].buf, offset=offset)
+    try:
+        redacted, meta, applied = _W["process"](img, _worker_cfg(tier), _W["store"], inplace=True)
+        if redacted is not img:
+            # only the tiled path renders into its own memmap
+            if redacted.shape != img.shape:
+                raise ValueError(f"Processor returned invalid shape {redacted.shape}")
+            img[...] = redacted
+        del redacted
+    finally:
+        # drop the exported view before the next task reuses the buffer
+        del img
+    return meta, applied, os.getpid(), _worker_stats()
+
+
+def _worker_main(conn, cfg: Dict[str, Any], shm_name: str, threads: int, reload_gen) -> None:
+    # one process, one pipe: ("ready", pid) after loading, then one reply per (offset, shape, tier)
+    _init_worker(cfg, shm_name, threads, reload_gen)
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        try:
+            reply = ("ok", _run_slot(*task))
+        except Exception as e:
+            reply = ("error", e)
+        try:
+            conn.send(reply)
+        except Exception:
+            # an exception that does not pickle still reaches the API as text
+            conn.send(("error", RuntimeError(f"{type(reply[1]).__name__}: {reply[1]}")))
+    _W["shm"].close()
+
+
+# ---------- API side ----------
+
+class _Worker:
+    def __init__(self, proc, conn):
+        self.proc = proc
+        self.conn = conn
+        self.ready = False
+
+
+class InferencePool:
+    """
+    Process pool for /process that never pickles pixels.
+
+    One shared memory arena is cut into fixed slots of slot_bytes. The API copies the decoded RGB
+    image into a free slot, an idle worker maps the same slot, runs the pipeline and redacts in
+    place, and the API encodes the result straight from the slot before handing it back to the
+    free list. Images bigger than a slot return None so the caller runs them in-process.
+
+    Every worker is its own process with its own pipe, model registry and stage state.
+    request_reload bumps a shared generation that each worker acts on before its next image, and
+    each result carries the worker's counters, kept per pid for worker_stats. A worker that dies
+    or runs past task_timeout_s on one image is killed and respawned alone, requests on the other
+    workers are not affected.
+    """
+
+    def __init__(self, cfg: Dict[str, Any], workers: int = 2, slots: int = 4, slot_bytes: int = 36_000_000,
+                 acquire_timeout_s: float = 10.0, task_timeout_s: float = 120.0, threads: int = 1):
+        self.cfg = cfg
+        self.workers = max(1, int(workers))
+        self.slot_bytes = int(slot_bytes)
+        self.acquire_timeout_s = float(acquire_timeout_s)
+        self.task_timeout_s = float(task_timeout_s)
+        self.threads = max(1, int(threads))
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, int(slots)) * self.slot_bytes)
+        self._free: "queue.Queue[int]" = queue.Queue()
+        for i in range(max(1, int(slots))):
+            self._free.put(i)
+        self._lock = threading.Lock()
+        self._ctx = mp.get_context("spawn")
+        self._reload_gen = self._ctx.Value("i", 0)
+        self._worker_snapshots: Dict[int, Dict[str, Any]] = {}
+        self._workers: List[_Worker] = [self._spawn() for _ in range(self.workers)]
+        self._idle: "queue.Queue[int]" = queue.Queue()
+        for i in range(self.workers):
+            self._idle.put(i)
+        self.pooled = 0
+        self.oversize = 0
+        self.restarts = 0
+        self.timeouts = 0
+
+    def _spawn(self) -> _Worker:
+        parent, child = self._ctx.Pipe()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(child, self.cfg, self._shm.name, self.threads, self._reload_gen),
+            name="inference-worker",
+            daemon=True,
+        )
+        proc.start()
+        child.close()
+        return _Worker(proc, parent)
+
+    def _replace(self, idx: int) -> None:
+        # a hung worker still maps the arena, it must be gone before its slot is reused
+        w = self._workers[idx]
+        if w.proc.is_alive():
+            w.proc.kill()
+        w.proc.join(5.0)
+        w.conn.close()
+        with self._lock:
+            self._worker_snapshots.pop(w.proc.pid, None)
+            self.restarts += 1
+        self._workers[idx] = self._spawn()
+
+    def _call(self, w: _Worker, task: Tuple[int, Tuple[int, int, int], Optional[str]]):
+        if not w.ready:
+            # a fresh worker loads its models first, that is not counted against the image
+            if not w.conn.poll(self.task_timeout_s):
+                raise TimeoutError
+            w.conn.recv()
+            w.ready = True
+        w.conn.send(task)
+        if not w.conn.poll(self.task_timeout_s):
+            raise TimeoutError
+        return w.conn.recv()
+
+    def request_reload(self) -> int:
+        """
+        Asks every worker to re-version its models before its next image. Returns the generation.
+        """
+        with self._reload_gen.get_lock():
+            self._reload_gen.value += 1
+            return self._reload_gen.value
+
+    def worker_stats(self) -> Dict[int, Dict[str, Any]]:
+        """
+        {pid: snapshot} as of each worker's last image.
+        """
+        with self._lock:
+            return dict(self._worker_snapshots)
+
+    def process(
+        self, img_rgb: np.ndarray, tier: Optional[str], finish: Callable[[np.ndarray], Any]
+    ) -> Optional[Tuple[Any, Dict[str, Any], bool]]:
+        """
+        Returns (finish(redacted view), meta, applied), or None when img_rgb does not fit a slot.
+        finish runs while the slot is still held, the view is invalid once it returns.
+        Raises TimeoutError when no slot or worker frees up within acquire_timeout_s, and
+        RuntimeError when the worker crashed or timed out on this image.
+        """
+        if img_rgb.dtype != np.uint8 or img_rgb.nbytes > self.slot_bytes:
+            self.oversize += 1
+            return None
+        try:
+            slot = self._free.get(timeout=self.acquire_timeout_s)
+        except queue.Empty:
+            raise TimeoutError(f"no free inference slot within {self.acquire_timeout_s}s")
+
+        offset = slot * self.slot_bytes
+        view = np.ndarray(img_rgb.shape, dtype=np.uint8, buffer=self._shm.buf, offset=offset)
+        try:
+            view[...] = img_rgb
+            try:
+                idx = self._idle.get(timeout=self.acquire_timeout_s)
+            except queue.Empty:
+                raise TimeoutError(f"no idle inference worker within {self.acquire_timeout_s}s")
+            try:
+                status, payload = self._call(self._workers[idx], (offset, img_rgb.shape, tier))
+            except TimeoutError:
+                # e.g. Tesseract stuck on a bad image, only this worker is killed
+                self.timeouts += 1
+                self._replace(idx)
+                raise RuntimeError(f"inference worker did not finish within {self.task_timeout_s}s")
+            except (EOFError, OSError):
+                # the worker died (OOM, native crash), respawn it so the next request gets a live one
+                self._replace(idx)
+                raise RuntimeError("inference worker exited while processing the image")
+            finally:
+                self._idle.put(idx)
+            if status == "error":
+                raise payload
+            meta, applied, pid, snapshot = payload
+            with self._lock:
+                self._worker_snapshots[pid] = snapshot
+            self.pooled += 1
+            return finish(view), meta, applied
+        finally:
+            del view
+            self._free.put(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "idle_workers": self._idle.qsize(),
+            "free_slots": self._free.qsize(),
+            "pooled": self.pooled,
+            "oversize": self.oversize,
+            "restarts": self.restarts,
+            "timeouts": self.timeouts,
+            "reload_generation": self._reload_gen.value,
+        }
+
+    def close(self) -> None:
+        for w in self._workers:
+            try:
+                w.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for w in self._workers:
+            w.proc.join(5.0)
+            if w.proc.is_alive():
+                w.proc.kill()
+            w.conn.close()
+        self._shm.close()
+        self._shm.unlink()
+
+
+def combine_stats(parts: List[Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    Sums the integer counters of several processes' stats dicts, nested dicts are combined the
+    same way and any other value is taken from the first process that has it. None when all are None.
+    """
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return None
+    out: Dict[str, Any] = {}
+    for part in parts:
+        for k, v in part.items():
+            if k not in out:
+                out[k] = combine_stats([v]) if isinstance(v, dict) else v
+            elif isinstance(v, dict) and isinstance(out[k], dict):
+                out[k] = combine_stats([out[k], v])
+            elif isinstance(v, int) and not isinstance(v, bool) and isinstance(out[k], int):
+                out[k] += v
+    return out
+
+
+def build_inference_pool(cfg: Dict[str, Any]) -> Optional[InferencePool]:
+    """
+    Config keys supported under cfg["pool"]:
+      enabled: bool            default False
+      workers: int             inference processes, default 2
+      slots: int               images in flight, default 2 per worker
+      max_megapixels: float    slot size, bigger images run in the API process, default 12
+      acquire_timeout_s: float wait for a free slot before answering 503, default 10
+      task_timeout_s: float    a worker busy longer on one image is killed and replaced, default 120
+    Each worker gets an equal share of this API worker's cores (cpu_budget per_worker).
+    """
+    pool_cfg = cfg.get("pool", {}) or {}
+    if not bool(pool_cfg.get("enabled", False)):
+        return None
+    workers = max(1, int(pool_cfg.get("workers", 2)))
+    return InferencePool(
+        cfg,
+        workers=workers,
+        slots=int(pool_cfg.get("slots") or 2 * workers),
+        slot_bytes=int(float(pool_cfg.get("max_megapixels", 12)) * 1_000_000) * 3,
+        acquire_timeout_s=float(pool_cfg.get("acquire_timeout_s", 10)),
+        task_timeout_s=float(pool_cfg.get("task_timeout_s", 120)),
+        threads=max(1, cpu_budget(cfg)["per_worker"] // workers),
+    )
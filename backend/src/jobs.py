@@ -0,0 +1,336 @@
+from typing import Dict, Any, Optional, Callable, Tuple, List, Iterator, Iterable
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    content_type TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    expires REAL,
+    applied INTEGER,
+    meta TEXT,
+    error TEXT,
+    claimed_by TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_pick ON jobs (status, priority DESC, created);
+CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires);
+"""
+
+# queued -> running -> done | failed, running -> queued again on a retryable error or an expired lease
+TERMINAL = ("done", "failed")
+# columns added after the first release, created on older databases at startup
+_ADDED_COLUMNS = (("claimed_by", "TEXT"), ("lease_until", "REAL"))
+
+
+class JobQueue:
+    """
+    Durable job queue in SQLite plus a folder for uploads and results.
+    Every call opens its own connection, so API threads, worker threads and other uvicorn
+    processes can share one database. Claims use BEGIN IMMEDIATE so a job runs once.
+
+    A claim holds a lease of lease_s seconds under this queue's owner id, renewed by the workers
+    while the job runs. Only running jobs whose lease expired (their process died) are requeued,
+    and complete/fail from an owner that lost its lease are ignored.
+    """
+
+    def __init__(
+        self, db_path: str, data_dir: str, max_attempts: int = 3, result_ttl_s: float = 3600.0, lease_s: float = 60.0
+    ):
+        self.db_path = db_path
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lease_s = float(lease_s)
+        self.inputs_dir = os.path.join(data_dir, "inputs")
+        self.results_dir = os.path.join(data_dir, "results")
+        self.max_attempts = max(1, int(max_attempts))
+        self.result_ttl_s = float(result_ttl_s)
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        os.makedirs(self.inputs_dir, exist_ok=True)
+        os.makedirs(self.results_dir, exist_ok=True)
+
+        with self._conn() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.executescript(_SCHEMA)
+            have = {r["name"] for r in c.execute("PRAGMA table_info(jobs)")}
+            for name, kind in _ADDED_COLUMNS:
+                if name not in have:
+                    c.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    @contextlib.contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        # autocommit, statements that must be atomic run inside an explicit BEGIN
+        with contextlib.closing(sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)) as c:
+            c.row_factory = sqlite3.Row
+            yield c
+
+    def input_path(self, job_id: str) -> str:
+        return os.path.join(self.inputs_dir, f"{job_id}.bin")
+
+    def result_path(self, job_id: str) -> str:
+        return os.path.join(self.results_dir, f"{job_id}.jpg")
+
+    def depth(self) -> int:
+        with self._conn() as c:
+            return int(c.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0])
+
+    def enqueue(self, raw: bytes, content_type: str, priority: int = 0) -> str:
+        job_id = uuid.uuid4().hex
+        tmp = self.input_path(job_id) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(raw)
+        os.replace(tmp, self.input_path(job_id))
+        now = time.time()
+        with self._conn() as c:
+            c.execute(
+                "INSERT INTO jobs (id, status, priority, max_attempts, content_type, created, updated) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, int(priority), self.max_attempts, content_type, now, now),
+            )
+        return job_id
+
+    def claim(self) -> Optional[str]:
+        now = time.time()
+        with self._conn() as c:
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                # a lease that ran out means its process died mid-job, that attempt counts
+                c.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+                    "expires = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END, "
+                    "error = 'lease expired', claimed_by = NULL, lease_until = NULL, updated = ? "
+                    "WHERE status = 'running' AND lease_until < ?",
+                    (now + self.result_ttl_s, now, now),
+                )
+                row = c.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    c.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ?, "
+                        "claimed_by = ?, lease_until = ? WHERE id = ?",
+                        (now, self.owner, now + self.lease_s, row["id"]),
+                    )
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+        return None if row is None else row["id"]
+
+    def renew(self, job_ids: Iterable[str]) -> None:
+        """
+        Extends the leases this owner holds on running jobs.
+        """
+        until = time.time() + self.lease_s
+        with self._conn() as c:
+            c.executemany(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' AND claimed_by = ?",
+                [(until, job_id, self.owner) for job_id in job_ids],
+            )
+
+    def complete(self, job_id: str, result: bytes, meta: Dict[str, Any], applied: bool) -> None:
+        tmp = self.result_path(job_id) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(result)
+        os.replace(tmp, self.result_path(job_id))
+        now = time.time()
+        with self._conn() as c:
+            done = c.execute(
+                "UPDATE jobs SET status = 'done', updated = ?, expires = ?, applied = ?, meta = ?, error = NULL, "
+                "claimed_by = NULL, lease_until = NULL WHERE id = ? AND status = 'running' AND claimed_by = ?",
+                (now, now + self.result_ttl_s, int(bool(applied)), json.dumps(meta, default=str), job_id, self.owner),
+            ).rowcount
+        if done:
+            self._remove(self.input_path(job_id))
+
+    def fail(self, job_id: str, error: str, retry: bool = True) -> str:
+        """
+        Puts the job back in line while attempts remain, else marks it failed. Returns the new status,
+        or the current one when this owner no longer holds the job.
+        """
+        now = time.time()
+        with self._conn() as c:
+            row = c.execute(
+                "SELECT status, attempts, max_attempts, claimed_by FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return "failed"
+            if row["status"] != "running" or row["claimed_by"] != self.owner:
+                return row["status"]
+            status = "queued" if retry and row["attempts"] < row["max_attempts"] else "failed"
+            expires = now + self.result_ttl_s if status == "failed" else None
+            c.execute(
+                "UPDATE jobs SET status = ?, updated = ?, expires = ?, error = ?, claimed_by = NULL, "
+                "lease_until = NULL WHERE id = ? AND claimed_by = ?",
+                (status, now, expires, error, job_id, self.owner),
+            )
+        if status == "failed":
+            self._remove(self.input_path(job_id))
+        return status
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._conn() as c:
+            row = c.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["meta"] = json.loads(job["meta"]) if job["meta"] else None
+        job["applied"] = None if job["applied"] is None else bool(job["applied"])
+        return job
+
+    def evict_expired(self) -> int:
+        now = time.time()
+        with self._conn() as c:
+            ids = [r["id"] for r in c.execute("SELECT id FROM jobs WHERE expires IS NOT NULL AND expires < ?", (now,))]
+            c.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+        for job_id in ids:
+            self._remove(self.result_path(job_id))
+            self._remove(self.input_path(job_id))
+        return len(ids)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class JobWorkers:
+    """
+    Threads that claim jobs and run `handler(raw, content_type) -> (result_bytes, meta, applied)`.
+    A ValueError from the handler means bad input and fails the job without retries.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[bytes, str], Tuple[bytes, Dict[str, Any], bool]],
+        workers: int = 2,
+        poll_s: float = 0.5,
+        evict_every_s: float = 60.0,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.n = max(1, int(workers))
+        self.poll_s = float(poll_s)
+        self.evict_every_s = float(evict_every_s)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running: set = set()
+        self._running_lock = threading.Lock()
+
+    def start(self) -> None:
+        for i in range(self.n):
+            t = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        threading.Thread(target=self._evict_loop, name="job-evict", daemon=True).start()
+        threading.Thread(target=self._lease_loop, name="job-lease", daemon=True).start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        backoff = self.poll_s
+        while not self._stop.is_set():
+            try:
+                job_id = self.queue.claim()
+                job = self.queue.get(job_id) if job_id is not None else None
+            except sqlite3.Error as e:
+                # e.g. database locked past the busy timeout, a claimed job is requeued when its lease runs out
+                print(f"[jobs] claim failed, retrying in {backoff:.1f}s: {type(e).__name__}: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = self.poll_s
+            if job is None:
+                self._wake.wait(self.poll_s)
+                self._wake.clear()
+                continue
+
+            with self._running_lock:
+                self._running.add(job_id)
+            try:
+                self._handle(job)
+            except sqlite3.Error as e:
+                # the outcome was not recorded, the job is retried once its lease runs out
+                print(f"[jobs] {job_id} result not recorded: {type(e).__name__}: {e}")
+            finally:
+                with self._running_lock:
+                    self._running.discard(job_id)
+
+    def _handle(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        try:
+            with open(self.queue.input_path(job_id), "rb") as f:
+                raw = f.read()
+            result, meta, applied = self.handler(raw, job["content_type"])
+            self.queue.complete(job_id, result, meta, applied)
+        except ValueError as e:
+            self.queue.fail(job_id, f"{type(e).__name__}: {e}", retry=False)
+        except Exception as e:
+            status = self.queue.fail(job_id, f"{type(e).__name__}: {e}")
+            print(f"[jobs] {job_id} attempt {job['attempts']} failed, now {status}: {type(e).__name__}: {e}")
+
+    def _lease_loop(self) -> None:
+        while not self._stop.wait(self.queue.lease_s / 3.0):
+            with self._running_lock:
+                ids = list(self._running)
+            if not ids:
+                continue
+            try:
+                self.queue.renew(ids)
+            except sqlite3.Error as e:
+                print(f"[jobs] lease renewal failed: {type(e).__name__}: {e}")
+
+    def _evict_loop(self) -> None:
+        while not self._stop.wait(self.evict_every_s):
+            try:
+                n = self.queue.evict_expired()
+                if n:
+                    print(f"[jobs] evicted {n} expired jobs")
+            except Exception as e:
+                print(f"[jobs] eviction failed: {type(e).__name__}: {e}")
+
+
+def build_job_queue(cfg: Dict[str, Any]) -> Optional[JobQueue]:
+    """
+    Config keys supported under cfg["jobs"]:
+      enabled: bool            default False
+      dir: str                 uploads and results, default backend/results/jobs
+      db: str                  default <dir>/jobs.sqlite3
+      workers: int             default 2
+      max_attempts: int        default 3
+      result_ttl_s: float      default 3600
+      lease_s: float           a running job whose worker stops renewing for this long is requeued, default 60
+      max_queued: int          new jobs are refused above this depth, default 1000
+    """
+    jobs_cfg = cfg.get("jobs", {}) or {}
+    if not bool(jobs_cfg.get("enabled", False)):
+        return None
+    data_dir = jobs_cfg.get("dir") or "backend/results/jobs"
+    return JobQueue(
+        db_path=jobs_cfg.get("db") or os.path.join(data_dir, "jobs.sqlite3"),
+        data_dir=data_dir,
+        max_attempts=int(jobs_cfg.get("max_attempts", 3)),
+        result_ttl_s=float(jobs_cfg.get("result_ttl_s", 3600)),
+        lease_s=float(jobs_cfg.get("lease_s", 60)),
+    )
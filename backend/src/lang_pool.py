@@ -0,0 +1,198 @@
+from __future__ import annotations
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+import os
+import re
+import threading
+import time
+
+from .model_registry import get_model_registry
+
+# ---------- Script and language routing for OCR lines ----------
+
+_HAN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+_TAMIL = re.compile(r"[\u0b80-\u0bff]")
+_LATIN = re.compile(r"[A-Za-z\u00c0-\u024f]")
+_WORD = re.compile(r"[a-z]+")
+
+# Frequent Malay function words that are rare in English, enough to tell the two apart on a sign
+_MALAY_WORDS = frozenset(
+    "dan yang di ke dari untuk dengan ini itu tidak adalah ada akan kami kita anda saya "
+    "jalan lorong kedai harga sila dilarang masuk keluar awas percuma baru buka tutup".split()
+)
+
+# Tesseract script names from OSD -> language packs, the default when OSD is off or unsure
+DEFAULT_SCRIPT_LANGS = {"Latin": "eng+msa", "Han": "chi_sim+eng", "HanS": "chi_sim+eng", "Tamil": "tam+eng"}
+
+
+def detect_language(text: str) -> str:
+    """
+    "zh", "ta", "ms" or "en" for one OCR line, by majority script, Malay by function words.
+    """
+    han = len(_HAN.findall(text))
+    tamil = len(_TAMIL.findall(text))
+    latin = len(_LATIN.findall(text))
+    if han and han >= max(tamil, latin / 2):
+        return "zh"
+    if tamil and tamil >= latin:
+        return "ta"
+    words = _WORD.findall(text.lower())
+    if words and sum(w in _MALAY_WORDS for w in words) * 4 >= len(words):
+        return "ms"
+    return "en"
+
+
+_INSTALLED: Optional[set] = None
+
+
+def tesseract_lang(osd_script: Optional[str], cfg: Dict[str, Any]) -> Optional[str]:
+    """
+    Language packs for this image from the OSD script, limited to packs Tesseract has installed.
+    None leaves Tesseract on its own default.
+    """
+    global _INSTALLED
+    ml = ((cfg.get("pii", {}) or {}).get("multilingual") or {})
+    script_langs = dict(DEFAULT_SCRIPT_LANGS, **(ml.get("script_langs") or {}))
+    wanted = script_langs.get(osd_script or "", ml.get("default_lang", "eng"))
+    if _INSTALLED is None:
+        import pytesseract
+        try:
+            _INSTALLED = set(pytesseract.get_languages(config=""))
+        except Exception:
+            _INSTALLED = set()
+    packs = [p for p in wanted.split("+") if not _INSTALLED or p in _INSTALLED]
+    return "+".join(packs) or None
+
+
+def _rss_mb() -> float:
+    # Linux only, elsewhere the pool falls back to fallback_mb per analyzer
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def _model_lang(model: str) -> str:
+    # spaCy package names start with their language code, "xx" for the multilingual ones
+    return model.split("_", 1)[0]
+
+
+class AnalyzerPool:
+    """
+    Non-English analyzers, loaded on first use through the model registry and kept in an LRU.
+    English stays on the main analyzer (ocr._get_analyzer) and is never evicted here.
+
+    Entries are per spaCy model, languages mapped to the same model (ms and ta on xx_ent_wiki_sm)
+    share one engine, built for the model's own language code. Each entry is charged the process
+    RSS growth seen while it loaded, or fallback_mb when that cannot be measured. Least recently
+    used entries are evicted while the pool is over max_mb, and any entry idle for idle_s is
+    evicted on the next access.
+    """
+
+    def __init__(self, models: Dict[str, str], max_mb: float = 1500.0, idle_s: float = 600.0, fallback_mb: float = 500.0):
+        self.models = dict(models)
+        self.max_mb = float(max_mb)
+        self.idle_s = float(idle_s)
+        self.fallback_mb = float(fallback_mb)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _source(model: str) -> str:
+        return f"{_model_lang(model)}:{model}"
+
+    def _evict(self, model: str) -> None:
+        self._entries.pop(model, None)
+        get_model_registry().evict("analyzer", self._source(model))
+        self.evictions += 1
+        print(f"[lang pool] evicted {model}")
+
+    def get(self, lang: str) -> Optional[Tuple[Any, str]]:
+        """
+        (analyzer, language code to call it with) for lang, or None when no model is configured for it.
+        """
+        model = self.models.get(lang)
+        if not model:
+            return None
+        now = time.time()
+        with self._lock:
+            for other, e in list(self._entries.items()):
+                if other != model and now - e["used"] > self.idle_s:
+                    self._evict(other)
+
+            entry = self._entries.get(model)
+            if entry is None:
+                before = _rss_mb()
+                analyzer, _ = get_model_registry().get("analyzer", self._source(model))
+                grown = _rss_mb() - before
+                entry = {"analyzer": analyzer, "mb": grown if grown > 0 else self.fallback_mb}
+                self._entries[model] = entry
+                self.loads += 1
+                while sum(e["mb"] for e in self._entries.values()) > self.max_mb and len(self._entries) > 1:
+                    self._evict(next(iter(self._entries)))
+            entry["used"] = now
+            self._entries.move_to_end(model)
+            return entry["analyzer"], _model_lang(model)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": {k: round(e["mb"]) for k, e in self._entries.items()},
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+_POOL: Optional[AnalyzerPool] = None
+
+
+def get_analyzer_pool(cfg: Dict[str, Any]) -> Optional[AnalyzerPool]:
+    """
+    Process-wide pool built from cfg["pii"]["multilingual"], None when disabled.
+
+    Config keys supported:
+      enabled: bool           default False
+      models: dict            language -> spaCy model, default zh_core_web_sm, xx_ent_wiki_sm for ms and ta
+      max_mb: float           default 1500
+      idle_s: float           default 600
+      script_langs: dict      OSD script -> Tesseract packs, see DEFAULT_SCRIPT_LANGS
+      default_lang: str       packs when OSD is unsure, default eng
+    """
+    global _POOL
+    ml = ((cfg.get("pii", {}) or {}).get("multilingual") or {})
+    if not bool(ml.get("enabled", False)):
+        return None
+    if _POOL is None:
+        models = ml.get("models") or {"zh": "zh_core_web_sm", "ms": "xx_ent_wiki_sm", "ta": "xx_ent_wiki_sm"}
+        _POOL = AnalyzerPool(
+            models={k: v for k, v in models.items() if k != "en"},
+            max_mb=float(ml.get("max_mb", 1500)),
+            idle_s=float(ml.get("idle_s", 600)),
+        )
+    return _POOL
+
+
+def group_lines(words: List[Dict[str, Any]]) -> List[Tuple[str, List[int], List[Tuple[int, int]]]]:
+    """
+    Groups OCR words by their Tesseract line, returns (line_text, word_indices, char_spans).
+    Han words are joined without spaces, everything else with one space.
+    """
+    lines: "OrderedDict[Any, List[int]]" = OrderedDict()
+    for i, w in enumerate(words):
+        lines.setdefault(w.get("line"), []).append(i)
+
+    out = []
+    for idxs in lines.values():
+        text, spans = "", []
+        for i in idxs:
+            t = words[i]["text"]
+            if text and not (_HAN.match(t[:1]) and _HAN.match(text[-1:])):
+                text += " "
+            spans.append((len(text), len(text) + len(t)))
+            text += t
+        out.append((text, idxs, spans))
+    return out
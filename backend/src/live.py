@@ -0,0 +1,108 @@
+from __future__ import annotations
+from typing import List, Dict, Any, Optional
+import time
+import numpy as np
+import cv2
+
+from .registry import run_detectors
+
+
+# ---------- Camera preview, plates plus the regex text path on low-resolution frames ----------
+
+def decode_frame(raw: bytes) -> np.ndarray:
+    """
+    Decodes one JPEG or PNG preview frame to RGB, raises ValueError when it cannot.
+    """
+    bgr = cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError("Frame is not a decodable image")
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
+class LivePreview:
+    """
+    Per-connection state for the live preview socket.
+
+    Detectors come from the registry (run_detectors) on shared views. Plate detectors run on every
+    frame at live.imgsz. The text detectors are the slow half and run with pii.analyzer off (regex
+    path), only when a moving average of their latency still fits in what is left of live.budget_ms.
+    Otherwise the last text boxes are sent again, for at most live.text_max_age frames before OCR
+    runs regardless.
+
+    Config keys supported under cfg["live"]:
+      budget_ms: float       per-frame target, default 150
+      imgsz: int             YOLO inference size, default 320
+      max_side: int          frames are downscaled to this long side first, default 640
+      text_max_age: int      default 5
+    """
+
+    def __init__(self, cfg: Dict[str, Any]):
+        self.cfg = cfg
+        live_cfg = cfg.get("live", {}) or {}
+        self.budget_ms = float(live_cfg.get("budget_ms", 150))
+        self.imgsz = int(live_cfg.get("imgsz", 320))
+        self.max_side = int(live_cfg.get("max_side", 640))
+        self.text_max_age = max(0, int(live_cfg.get("text_max_age", 5)))
+        self.det_cfg = dict(
+            cfg,
+            lp=dict(cfg.get("lp", {}) or {}, imgsz=self.imgsz),
+            pii=dict(cfg.get("pii", {}) or {}, analyzer=False),
+        )
+
+        self.frames = 0
+        self.text_boxes: List[Dict[str, Any]] = []
+        self.text_age = 0
+        self.text_ms: Optional[float] = None
+        self.last_shape: Optional[tuple] = None
+
+    def _text_fits(self, spent_ms: float) -> bool:
+        if self.text_ms is None or self.text_age >= self.text_max_age:
+            return True
+        return spent_ms + self.text_ms <= self.budget_ms
+
+    def process(self, img_rgb: np.ndarray) -> Dict[str, Any]:
+        """
+        Returns {"width", "height", "boxes", "text_fresh", "timings_ms"}, boxes in img_rgb coordinates.
+        """
+        t0 = time.perf_counter()
+        self.frames += 1
+        h, w = img_rgb.shape[:2]
+        scale = min(1.0, self.max_side / max(h, w))
+        small = img_rgb if scale == 1.0 else cv2.resize(
+            img_rgb, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA
+        )
+
+        # text boxes from a differently sized stream are meaningless
+        if self.last_shape != small.shape:
+            self.text_boxes, self.text_ms, self.last_shape = [], None, small.shape
+
+        found, _ = run_detectors(small, self.det_cfg, gates={"lp"})
+        lp_boxes = [b.to_dict() for boxes in found.values() for b in boxes]
+        t1 = time.perf_counter()
+
+        text_fresh = self._text_fits((t1 - t0) * 1000.0)
+        if text_fresh:
+            found, _ = run_detectors(small, self.det_cfg, skip={"lp"})
+            self.text_boxes = [b.to_dict() for boxes in found.values() for b in boxes]
+            took = (time.perf_counter() - t1) * 1000.0
+            self.text_ms = took if self.text_ms is None else 0.7 * self.text_ms + 0.3 * took
+            self.text_age = 0
+        else:
+            self.text_age += 1
+        t2 = time.perf_counter()
+
+        boxes = [
+            dict(b, x1=b["x1"] / scale, y1=b["y1"] / scale, x2=b["x2"] / scale, y2=b["y2"] / scale)
+            for b in lp_boxes + self.text_boxes
+        ]
+        return {
+            "width": w,
+            "height": h,
+            "boxes": boxes,
+            "text_fresh": text_fresh,
+            "timings_ms": {
+                "lp": (t1 - t0) * 1000.0,
+                "text": (t2 - t1) * 1000.0 if text_fresh else 0.0,
+                "total": (t2 - t0) * 1000.0,
+            },
+        }
@@ -1,39 +1,36 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 import os
+import threading
 
-# simple cache so you do not reload per request
-_MODEL_CACHE: Dict[str, Any] = {}
+from .resources import configure_torch_threads
+from .model_registry import get_model_registry, file_checksum, ModelKind
 
-def _get_model(weights_path: str):
+# Ultralytics predictors keep per-call state, serialize calls on a shared model
+_PREDICT_LOCK = threading.Lock()
+
+def _load_yolo(weights_path: str):
     from ultralytics import YOLO
-    m = _MODEL_CACHE.get(weights_path)
-    if m is None:
-        if not os.path.exists(weights_path):
-            raise FileNotFoundError(f"YOLO weights not found: {weights_path}")
-        m = YOLO(weights_path)
-        _MODEL_CACHE[weights_path] = m
-    return m
-
-from typing import List, Dict, Any
-import numpy as np
+    if not os.path.exists(weights_path):
+        raise FileNotFoundError(f"YOLO weights not found: {weights_path}")
+    configure_torch_threads()
+    return YOLO(weights_path)
 
-def detect_license_plates(img_rgb: np.ndarray, cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """
-    Detect license plates using a YOLO model.
+def _warm_yolo(model) -> None:
+    # first predict builds the predictor and allocates buffers, keep that off the request path
+    model.predict(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
 
-    Expects:
-      - img_rgb: HxWx3 uint8, RGB
-      - cfg from config.yaml with:
-          cfg["paths"]["yolo_weights"] -> path to YOLO weights
-        Optional overrides:
-          cfg["lp"]["score_threshold"] -> float, default 0.25
-          cfg["lp"]["expects_bgr"] -> bool, default False
-          cfg["lp"]["labels_map"] -> dict[int,str], default {0: "license_plate"}
+get_model_registry().register_kind("yolo", ModelKind(version=file_checksum, load=_load_yolo, warm=_warm_yolo))
 
-    Returns a list of dicts:
-      {"x1": int, "y1": int, "x2": int, "y2": int, "label": str, "score": float|None}
+def _get_model(weights_path: str) -> Tuple[Any, str]:
     """
+    (model, version) from the model registry, loaded once per process and hot-swapped on new weights.
+    """
+    return get_model_registry().get("yolo", weights_path)
+
+def _predict_boxes(
+    img_rgb: np.ndarray, cfg: Dict[str, Any], conf: float, imgsz: Optional[int] = None, channels: str = "rgb"
+) -> List[Dict[str, Any]]:
     if not isinstance(img_rgb, np.ndarray) or img_rgb.ndim != 3 or img_rgb.shape[2] != 3:
         raise ValueError(f"Expected RGB ndarray HxWx3, got shape {getattr(img_rgb, 'shape', None)}")
 
@@ -47,19 +44,21 @@ def detect_license_plates(img_rgb: np.ndarray, cfg: Dict[str, Any]) -> List[Dict
         raise KeyError("cfg['paths']['yolo_weights'] is required")
 
     lp_cfg = cfg.get("lp", {}) or {}
-    conf = float(lp_cfg.get("score_threshold", 0.25))
     expects_bgr = bool(lp_cfg.get("expects_bgr", False))
+    imgsz = imgsz or lp_cfg.get("imgsz")
     labels_map = lp_cfg.get("labels_map") or {0: "license_plate"}
 
     # Model
-    model = _get_model(weights_path)
+    model, _ = _get_model(weights_path)
 
-    # Input color space
-    src = img_rgb[:, :, ::-1] if expects_bgr else img_rgb
+    # Input color space, flip only when the caller's order is not the model's
+    src = img_rgb[:, :, ::-1] if expects_bgr != (channels == "bgr") else img_rgb
 
-    # Inference
+    # Inference, imgsz None keeps the size the model was trained at
+    kwargs = {"imgsz": int(imgsz)} if imgsz else {}
     try:
-        results = model.predict(src, conf=conf, verbose=False)
+        with _PREDICT_LOCK:
+            results = model.predict(src, conf=conf, verbose=False, **kwargs)
     except Exception as e:
         raise RuntimeError(f"YOLO predict failed: {type(e).__name__}: {e}")
 
@@ -107,4 +106,42 @@ def detect_license_plates(img_rgb: np.ndarray, cfg: Dict[str, Any]) -> List[Dict
             "score": float(sc) if sc is not None else None,
         })
 
-    return out
\ No newline at end of file
+    return out
+
+
+def detect_license_plates(
+    img_rgb: np.ndarray, cfg: Dict[str, Any], imgsz: Optional[int] = None, channels: str = "rgb"
+) -> List[Dict[str, Any]]:
+    """
+    Detect license plates using a YOLO model.
+
+    Expects:
+      - img_rgb: HxWx3 uint8, RGB
+      - cfg from config.yaml with:
+          cfg["paths"]["yolo_weights"] -> path to YOLO weights
+        Optional overrides:
+          cfg["lp"]["score_threshold"] -> float, default 0.25
+          cfg["lp"]["expects_bgr"] -> bool, default False
+          cfg["lp"]["labels_map"] -> dict[int,str], default {0: "license_plate"}
+          cfg["lp"]["imgsz"] -> int, inference size when the imgsz argument is not given
+      - imgsz: optional inference size, smaller is faster on low-resolution frames
+      - channels: "bgr" when img_rgb is already in BGR order, e.g. a shared registry view
+
+    Returns a list of dicts:
+      {"x1": int, "y1": int, "x2": int, "y2": int, "label": str, "score": float|None}
+    """
+    lp_cfg = cfg.get("lp", {}) or {}
+    conf = float(lp_cfg.get("score_threshold", 0.25))
+    return _predict_boxes(img_rgb, cfg, conf, imgsz=imgsz, channels=channels)
+
+
+def detect_license_plate_candidates(
+    img_rgb: np.ndarray, cfg: Dict[str, Any], channels: str = "rgb"
+) -> List[Dict[str, Any]]:
+    """
+    Same as detect_license_plates, but keeps every box down to cfg["lp"]["candidate_floor"] (default 0.05)
+    so score_threshold can be changed later without running YOLO again.
+    """
+    lp_cfg = cfg.get("lp", {}) or {}
+    floor = float(lp_cfg.get("candidate_floor", 0.05))
+    return _predict_boxes(img_rgb, cfg, floor, channels=channels)
@@ -0,0 +1,212 @@
+from typing import Dict, Any, Optional, Callable, Tuple, List, Iterator
+from collections import deque
+from contextvars import ContextVar
+import contextlib
+import hashlib
+import os
+import threading
+import time
+
+# Bytes read per step when hashing weights
+_CHUNK = 1 << 20
+# path -> (size, mtime_ns, digest)
+_CHECKSUMS: Dict[str, Tuple[int, int, str]] = {}
+# load events kept for GET /models
+_HISTORY = 200
+# versions handed out to the current request, see record_versions
+_USED: ContextVar[Optional[Dict[str, str]]] = ContextVar("models_used", default=None)
+
+
+def file_checksum(path: str) -> str:
+    """
+    sha256 of a weights file, first 16 hex chars. Rehashed only when size or mtime change.
+    """
+    st = os.stat(path)
+    hit = _CHECKSUMS.get(path)
+    if hit is not None and hit[:2] == (st.st_size, st.st_mtime_ns):
+        return hit[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    digest = h.hexdigest()[:16]
+    _CHECKSUMS[path] = (st.st_size, st.st_mtime_ns, digest)
+    return digest
+
+
+def model_label(kind: str, source: str) -> str:
+    return f"{kind}/{os.path.basename(source) or source or 'default'}"
+
+
+@contextlib.contextmanager
+def record_versions() -> Iterator[Dict[str, str]]:
+    """
+    Collects {kind/source: version} of every model fetched inside the block, including from
+    threads started with contextvars.copy_context().run. A model swapped mid-request is
+    recorded with the version the request actually got. Blocks may nest.
+    """
+    outer = _USED.get()
+    used: Dict[str, str] = {}
+    token = _USED.set(used)
+    try:
+        yield used
+    finally:
+        _USED.reset(token)
+        # a nested block also reports to the enclosing one
+        if outer is not None:
+            outer.update(used)
+
+
+class ModelKind:
+    """
+    How to version, load and warm one kind of model. source is a weights path or a package name.
+    """
+
+    def __init__(
+        self,
+        version: Callable[[str], str],
+        load: Callable[[str], Any],
+        warm: Optional[Callable[[Any], None]] = None,
+    ):
+        self.version = version
+        self.load = load
+        self.warm = warm
+
+
+class ModelRegistry:
+    """
+    Process-wide holder of loaded models, keyed by (kind, source).
+
+    get() loads on first use. With a watcher running, every source is re-versioned each poll_s
+    seconds; a new version is loaded and warmed on the watcher thread while requests keep using
+    the old one, then swapped in with one assignment. A request holds the model it fetched, so an
+    in-flight request finishes on the version it started with. A failed load keeps the old model.
+    """
+
+    def __init__(self):
+        self._kinds: Dict[str, ModelKind] = {}
+        self._slots: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.history: "deque[Dict[str, Any]]" = deque(maxlen=_HISTORY)
+
+    def register_kind(self, kind: str, spec: ModelKind) -> None:
+        self._kinds[kind] = spec
+
+    def _load(self, key: Tuple[str, str], version: str) -> Dict[str, Any]:
+        kind, source = key
+        spec = self._kinds[kind]
+        t0 = time.perf_counter()
+        model = spec.load(source)
+        t1 = time.perf_counter()
+        if spec.warm is not None:
+            spec.warm(model)
+        t2 = time.perf_counter()
+        slot = {"model": model, "version": version, "loaded_at": time.time()}
+        self.history.append({
+            "kind": kind, "source": source, "version": version, "loaded_at": slot["loaded_at"],
+            "load_ms": (t1 - t0) * 1000.0, "warm_ms": (t2 - t1) * 1000.0,
+        })
+        print(f"[models] {kind} {os.path.basename(source) or source} version {version} "
+              f"load={(t1 - t0) * 1000.0:.0f}ms warm={(t2 - t1) * 1000.0:.0f}ms")
+        return slot
+
+    def get(self, kind: str, source: str) -> Tuple[Any, str]:
+        """
+        Returns (model, version), loading it on first use.
+        Inside record_versions the returned version is also noted for the request.
+        """
+        key = (kind, source)
+        slot = self._slots.get(key)
+        if slot is None:
+            with self._load_lock(key):
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._load(key, self._kinds[kind].version(source))
+                    self._slots[key] = slot
+        used = _USED.get()
+        if used is not None:
+            used[model_label(kind, source)] = slot["version"]
+        return slot["model"], slot["version"]
+
+    def _load_lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(key, threading.Lock())
+
+    def evict(self, kind: str, source: str) -> None:
+        """
+        Drops a loaded model, the next get() loads it again. Requests holding it finish normally.
+        Waits for a reload of the same model, so the watcher cannot bring it back.
+        """
+        key = (kind, source)
+        with self._load_lock(key):
+            self._slots.pop(key, None)
+
+    def loaded_version(self, kind: str, source: str) -> Optional[str]:
+        """
+        Version of the model get() currently hands out, None when it is not loaded.
+        """
+        slot = self._slots.get((kind, source))
+        return slot["version"] if slot is not None else None
+
+    def versions(self) -> Dict[str, str]:
+        return {model_label(kind, source): slot["version"] for (kind, source), slot in list(self._slots.items())}
+
+    def check(self) -> List[Tuple[str, str, str]]:
+        """
+        Re-versions every loaded source and swaps in new versions. Returns (kind, source, version) swapped.
+        """
+        swapped = []
+        for key, slot in list(self._slots.items()):
+            kind, source = key
+            try:
+                version = self._kinds[kind].version(source)
+                if version == slot["version"]:
+                    continue
+                with self._load_lock(key):
+                    # evicted or already swapped while this pass was running
+                    if self._slots.get(key) is not slot:
+                        continue
+                    fresh = self._load(key, version)
+                    # single assignment, readers see the old slot or the new one
+                    self._slots[key] = fresh
+                swapped.append((kind, source, version))
+            except Exception as e:
+                print(f"[models] reload of {kind} {source} failed, keeping {slot['version']}: {type(e).__name__}: {e}")
+        return swapped
+
+    def start_watcher(self, poll_s: float = 30.0) -> None:
+        if self._watcher is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(poll_s):
+                self.check()
+
+        self._watcher = threading.Thread(target=loop, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+
+
+_REGISTRY = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    return _REGISTRY
+
+
+def start_hot_reload(cfg: Dict[str, Any]) -> bool:
+    """
+    Config keys supported under cfg["models"]:
+      hot_reload: bool     watch loaded models for new versions, default False
+      poll_s: float        default 30
+    """
+    m_cfg = cfg.get("models", {}) or {}
+    if not bool(m_cfg.get("hot_reload", False)):
+        return False
+    _REGISTRY.start_watcher(float(m_cfg.get("poll_s", 30)))
+    return True
@@ -0,0 +1,190 @@
+from __future__ import annotations
+from typing import List, Dict, Any, Tuple, Optional
+from collections import OrderedDict
+import threading
+import numpy as np
+import cv2
+
+# Thumbnail used for the alignment check, small enough to keep thousands in memory
+_THUMB = 32
+
+
+def dhash(gray: np.ndarray) -> int:
+    """
+    64-bit difference hash, robust to rescaling and JPEG re-compression.
+    """
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def covered(fresh: List[Dict[str, Any]], reused: List[Dict[str, Any]], min_cover: float = 0.5) -> bool:
+    """
+    True when every fresh box lies at least min_cover of its area inside some reused box.
+    """
+    for b in fresh:
+        area = max(1, (b["x2"] - b["x1"]) * (b["y2"] - b["y1"]))
+        for r in reused:
+            ix = min(b["x2"], r["x2"]) - max(b["x1"], r["x1"])
+            iy = min(b["y2"], r["y2"]) - max(b["y1"], r["y1"])
+            if ix > 0 and iy > 0 and ix * iy >= min_cover * area:
+                break
+        else:
+            return False
+    return True
+
+
+class NearDuplicateIndex:
+    """
+    Bounded LRU of recent images keyed by dHash, holding their final boxes.
+
+    A lookup hit needs a dHash within max_distance, the same aspect ratio within aspect_tol,
+    and aligned thumbnails: phase correlation shift under max_shift and mean abs diff under max_mad.
+    Candidates are tried nearest first, up to max_checks of them. Boxes are then rescaled to the
+    new size and padded by pad_ratio of their size, since burst shots move a little.
+
+    A hit is only a hint: a new plate or a new line of text is far below what a 64-bit hash and a
+    32x32 thumbnail can see, so detect_image_np re-runs text detection and reuses nothing when the
+    fresh boxes are not covered by the reused ones.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 4096,
+        max_distance: int = 6,
+        aspect_tol: float = 0.01,
+        max_shift: float = 1.0,
+        max_mad: float = 10.0,
+        pad_ratio: float = 0.05,
+        max_checks: int = 4,
+    ):
+        self.capacity = max(1, int(capacity))
+        self.max_distance = int(max_distance)
+        self.aspect_tol = float(aspect_tol)
+        self.max_shift = float(max_shift)
+        self.max_mad = float(max_mad)
+        self.pad_ratio = float(pad_ratio)
+        self.max_checks = max(1, int(max_checks))
+
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # hits whose re-detected text was not covered by the reused boxes
+        self.rejected = 0
+
+    @staticmethod
+    def signature(img_rgb: np.ndarray) -> Tuple[int, np.ndarray]:
+        gray = cv2.cvtColor(np.ascontiguousarray(img_rgb), cv2.COLOR_RGB2GRAY)
+        thumb = cv2.resize(gray, (_THUMB, _THUMB), interpolation=cv2.INTER_AREA)
+        return dhash(gray), thumb
+
+    def _aligned(self, a: np.ndarray, b: np.ndarray) -> bool:
+        (dx, dy), _ = cv2.phaseCorrelate(a.astype(np.float32), b.astype(np.float32))
+        if abs(dx) > self.max_shift or abs(dy) > self.max_shift:
+            return False
+        return float(np.mean(np.abs(a.astype(np.int16) - b.astype(np.int16)))) <= self.max_mad
+
+    def _rescale(self, entry: Dict[str, Any], w: int, h: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        sx, sy = w / entry["w"], h / entry["h"]
+
+        def scale(boxes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            out = []
+            for b in boxes:
+                px = (b["x2"] - b["x1"]) * sx * self.pad_ratio
+                py = (b["y2"] - b["y1"]) * sy * self.pad_ratio
+                out.append(dict(
+                    b,
+                    x1=int(max(0, b["x1"] * sx - px)),
+                    y1=int(max(0, b["y1"] * sy - py)),
+                    x2=int(min(w - 1, b["x2"] * sx + px)),
+                    y2=int(min(h - 1, b["y2"] * sy + py)),
+                ))
+            return out
+
+        return scale(entry["lp"]), scale(entry["pii"])
+
+    def lookup(
+        self, img_rgb: np.ndarray, sig: Optional[Tuple[int, np.ndarray]] = None
+    ) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]]:
+        """
+        Returns (lp_boxes, pii_boxes, distance) scaled to img_rgb, or None when nothing matches.
+        """
+        h, w = img_rgb.shape[:2]
+        hsh, thumb = sig or self.signature(img_rgb)
+        with self._lock:
+            near = []
+            for key, entry in self._entries.items():
+                d = _hamming(hsh, key)
+                if d <= self.max_distance and abs(w / h - entry["w"] / entry["h"]) <= self.aspect_tol * (w / h):
+                    near.append((d, key))
+            near.sort()
+            for d, key in near[:self.max_checks]:
+                entry = self._entries[key]
+                if self._aligned(thumb, entry["thumb"]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    break
+            else:
+                self.misses += 1
+                return None
+        lp, pii = self._rescale(entry, w, h)
+        return lp, pii, d
+
+    def add(
+        self, img_rgb: np.ndarray, lp_boxes: List[Dict[str, Any]], pii_boxes: List[Dict[str, Any]],
+        sig: Optional[Tuple[int, np.ndarray]] = None,
+    ) -> None:
+        h, w = img_rgb.shape[:2]
+        hsh, thumb = sig or self.signature(img_rgb)
+        entry = {
+            "w": w, "h": h, "thumb": thumb,
+            "lp": [dict(b) for b in lp_boxes],
+            "pii": [dict(b) for b in pii_boxes],
+        }
+        with self._lock:
+            self._entries[hsh] = entry
+            self._entries.move_to_end(hsh)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "rejected": self.rejected}
+
+
+_INDEX: Optional[NearDuplicateIndex] = None
+
+
+def get_near_dup_index(cfg: Dict[str, Any]) -> Optional[NearDuplicateIndex]:
+    """
+    Process-wide index built from cfg["near_dup"], None when disabled.
+
+    Config keys supported:
+      enabled: bool        default False
+      capacity: int        default 4096
+      max_distance: int    dHash bits out of 64, default 6
+      aspect_tol: float    default 0.01
+      max_shift: float     thumbnail pixels, default 1.0
+      max_mad: float       thumbnail mean abs diff, default 10
+      pad_ratio: float     default 0.05
+      max_checks: int      nearest candidates alignment-checked per lookup, default 4
+    """
+    global _INDEX
+    nd_cfg = cfg.get("near_dup", {}) or {}
+    if not bool(nd_cfg.get("enabled", False)):
+        return None
+    if _INDEX is None:
+        _INDEX = NearDuplicateIndex(
+            capacity=int(nd_cfg.get("capacity", 4096)),
+            max_distance=int(nd_cfg.get("max_distance", 6)),
+            aspect_tol=float(nd_cfg.get("aspect_tol", 0.01)),
+            max_shift=float(nd_cfg.get("max_shift", 1.0)),
+            max_mad=float(nd_cfg.get("max_mad", 10.0)),
+            pad_ratio=float(nd_cfg.get("pad_ratio", 0.05)),
+            max_checks=int(nd_cfg.get("max_checks", 4)),
+        )
+    return _INDEX
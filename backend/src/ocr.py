@@ -1,72 +1,269 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple
+import importlib.metadata
+import re
 import numpy as np
 import pytesseract
 
 from presidio_analyzer import AnalyzerEngine, RecognizerResult
 
-_analyzer: AnalyzerEngine | None = None
+from .model_registry import get_model_registry, ModelKind
+from .ocr_preprocess import preprocess_for_ocr, map_boxes_back
+from .pii_analyser import build_analyzer
+from .lang_pool import get_analyzer_pool, detect_language, group_lines, tesseract_lang
 
-def _get_analyzer(cfg) -> AnalyzerEngine:
-    global _analyzer
-    if _analyzer is not None:
-        return _analyzer
-
-    _analyzer = AnalyzerEngine()
+def _set_tesseract_cmd(cfg) -> None:
     tesseract_cmd = cfg.get("ocr", {}).get("tesseract_cmd")
     if tesseract_cmd:
         pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
-    return _analyzer
+
+# Presidio's own default when pii.nlp_model is not set
+_DEFAULT_NLP_MODEL = "en_core_web_lg"
+
+def _split_source(source: str) -> Tuple[str, str]:
+    # registry sources are "model" for English or "lang:model" for the language pool
+    lang, _, model = source.rpartition(":")
+    return lang or "en", model
+
+def _spacy_version(source: str) -> str:
+    name = _split_source(source)[1] or _DEFAULT_NLP_MODEL
+    try:
+        return f"{name}-{importlib.metadata.version(name)}"
+    except importlib.metadata.PackageNotFoundError:
+        return f"{name}-unknown"
+
+def _load_analyzer(source: str) -> AnalyzerEngine:
+    lang, model = _split_source(source)
+    if not model:
+        return AnalyzerEngine()
+    return build_analyzer(model, use_distilbert=False, language=lang)
+
+def _warm_analyzer(analyzer: AnalyzerEngine) -> None:
+    analyzer.analyze(text="Call John Smith in Singapore", language=analyzer.supported_languages[0])
+
+get_model_registry().register_kind(
+    "analyzer", ModelKind(version=_spacy_version, load=_load_analyzer, warm=_warm_analyzer)
+)
+
+# spaCy models that failed to load, served by the default analyzer instead
+_UNAVAILABLE: Dict[str, str] = {}
+
+def _get_analyzer(cfg) -> AnalyzerEngine:
+    """
+    cfg["pii"]["nlp_model"] picks a spaCy model, e.g. en_core_web_sm for the reduced tier.
+    Engines live in the model registry, one per spaCy model, hot-swapped on a new package version.
+    A model that is not installed falls back to the default analyzer, reported once.
+    """
+    nlp_model = (cfg.get("pii", {}) or {}).get("nlp_model") or ""
+    _set_tesseract_cmd(cfg)
+    if nlp_model and nlp_model not in _UNAVAILABLE:
+        try:
+            analyzer, _ = get_model_registry().get("analyzer", nlp_model)
+            return analyzer
+        except (OSError, ImportError) as e:
+            # spaCy raises OSError E050 for a model package that is not installed
+            _UNAVAILABLE[nlp_model] = f"{type(e).__name__}: {e}"
+            print(f"[pii] {nlp_model} could not be loaded, using the default analyzer: {e}")
+    analyzer, _ = get_model_registry().get("analyzer", "")
+    return analyzer
+
+def warm_analyzer(cfg) -> None:
+    """
+    Loads the analyzer cfg would use, e.g. a shedding tier's, so its first request is not a cold start.
+    """
+    if bool((cfg.get("pii", {}) or {}).get("analyzer", True)):
+        _get_analyzer(cfg)
+
+def _ocr_words(img_rgb: np.ndarray, cfg) -> List[Dict]:
+    """
+    Word level OCR. Each word is a dict with x1 y1 x2 y2 text conf, boxes clamped to the image.
+    Tesseract reads the single-channel buffer from preprocess_for_ocr (grayscale, ocr.scale,
+    optional deskew, orientation and binarization), boxes are mapped back to img_rgb coordinates.
+    "line" is Tesseract's (block, paragraph, line) id.
+    """
+    h_img, w_img = img_rgb.shape[:2]
+    # with the language pool on, the script from the same OSD pass picks the Tesseract language packs
+    multilingual = get_analyzer_pool(cfg) is not None
+    src, inv, script = preprocess_for_ocr(img_rgb, cfg, want_script=multilingual)
+    lang = tesseract_lang(script, cfg) if multilingual else None
+    data = pytesseract.image_to_data(src, lang=lang, output_type=pytesseract.Output.DICT)
+    n = len(data.get("text", []))
+    confs = data.get("conf", ["-1"] * n)
+
+    blocks, pars, lines = (data.get(k, [0] * n) for k in ("block_num", "par_num", "line_num"))
+
+    keep = [i for i in range(n) if (data["text"][i] or "").strip()]
+    if not keep:
+        return []
+    x1, y1, x2, y2 = map_boxes_back(
+        np.array([int(data["left"][i]) for i in keep]),
+        np.array([int(data["top"][i]) for i in keep]),
+        np.array([int(data["width"][i]) for i in keep]),
+        np.array([int(data["height"][i]) for i in keep]),
+        inv,
+    )
+
+    words: List[Dict] = []
+    for j, i in enumerate(keep):
+        # Bounds clamp
+        words.append({
+            "x1": int(max(0, x1[j])),
+            "y1": int(max(0, y1[j])),
+            "x2": int(min(w_img - 1, x2[j])),
+            "y2": int(min(h_img - 1, y2[j])),
+            "text": data["text"][i].strip(),
+            "conf": int(float(confs[i])),
+            "line": (blocks[i], pars[i], lines[i]),
+        })
+    return words
+
+def _word_results(words: List[Dict], cfg, analyzer: AnalyzerEngine, entities) -> List[List[RecognizerResult]]:
+    """
+    Analyzer hits per word, aligned with words. Every word is analyzed one by one on the main
+    analyzer, which holds the pattern recognizers (email, phone, card, IBAN, ...). With
+    pii.multilingual on, lines in another language also go whole to the pool analyzer of that
+    language, and its hits are added to every word their character span overlaps.
+    """
+    results = [analyzer.analyze(text=w["text"], language="en", entities=entities) for w in words]
+    pool = get_analyzer_pool(cfg)
+    if pool is None:
+        return results
+
+    for text, idxs, spans in group_lines(words):
+        lang = detect_language(text)
+        found = pool.get(lang) if lang != "en" else None
+        if found is None:
+            continue
+        other, code = found
+        try:
+            hits = other.analyze(text=text, language=code, entities=entities)
+        except ValueError:
+            # no recognizer of that language serves the requested entities
+            continue
+        for r in hits:
+            for i, (start, end) in zip(idxs, spans):
+                if start < r.end and r.start < end:
+                    results[i].append(r)
+    return results
 
 def find_text_pii(img_rgb: np.ndarray, cfg) -> List[Dict]:
     """
     Returns word-level boxes that the analyzer flags as PII.
     Each box is a dict with x1 y1 x2 y2 label score
+
+    Cheaper pipeline tiers set ocr.scale to OCR a downscaled copy, pii.patterns to try the
+    config regexes before the analyzer, and pii.analyzer false to use the regexes only.
     """
-    analyzer = _get_analyzer(cfg)
+    pii_cfg = cfg.get("pii", {}) or {}
+    if not bool(pii_cfg.get("analyzer", True)):
+        return find_text_regex(img_rgb, cfg)
 
-    # Word level OCR
-    data = pytesseract.image_to_data(img_rgb, output_type=pytesseract.Output.DICT)
-    n = len(data.get("text", []))
+    analyzer = _get_analyzer(cfg)
+    min_conf = int(cfg.get("ocr", {}).get("min_confidence", 50))
+    min_score = float(pii_cfg.get("min_score", 0.6))
+    entities = pii_cfg.get("entities") or None
+    pats = _compiled_patterns(cfg) if pii_cfg.get("patterns") else []
     out: List[Dict] = []
-    h_img, w_img = img_rgb.shape[:2]
 
-    # Analyze words individually with context off to keep it fast
-    for i in range(n):
-        txt = (data["text"][i] or "").strip()
-        if not txt:
-            continue
+    # Simple heuristic, skip tiny boxes and junk
+    words = [w for w in _ocr_words(img_rgb, cfg) if w["conf"] < 0 or w["conf"] >= min_conf]
 
-        # Simple heuristic, skip tiny boxes and junk
-        conf = int(data.get("conf", ["-1"] * n)[i])
-        if conf >= 0 and conf < int(cfg.get("ocr", {}).get("min_confidence", 50)):
+    rest: List[Dict] = []
+    for word in words:
+        name = _match_pattern(word["text"], pats)
+        if not name:
+            rest.append(word)
             continue
+        out.append({
+            "x1": word["x1"], "y1": word["y1"], "x2": word["x2"], "y2": word["y2"],
+            "label": name,
+            "score": 1.0,
+        })
 
-        x = int(data["left"][i])
-        y = int(data["top"][i])
-        w = int(data["width"][i])
-        h = int(data["height"][i])
-
-        # Bounds clamp
-        x1 = max(0, x)
-        y1 = max(0, y)
-        x2 = min(w_img - 1, x + w)
-        y2 = min(h_img - 1, y + h)
-
-        # Run Presidio
-        results: List[RecognizerResult] = analyzer.analyze(text=txt, language="en")
+    # Run Presidio
+    for word, results in zip(rest, _word_results(rest, cfg, analyzer, entities)):
         if not results:
             continue
 
         # Take the highest score entity for this token
         best = max(results, key=lambda r: r.score)
-        min_score = float(cfg.get("pii", {}).get("min_score", 0.6))
         if best.score < min_score:
             continue
 
         out.append({
-            "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+            "x1": word["x1"], "y1": word["y1"], "x2": word["x2"], "y2": word["y2"],
             "label": best.entity_type,
             "score": float(best.score)
         })
 
-    return out
\ No newline at end of file
+    return out
+
+def find_text_candidates(img_rgb: np.ndarray, cfg) -> List[Dict]:
+    """
+    Policy-free variant of find_text_pii for the detection store.
+    Every word with at least one analyzer hit is kept with its OCR confidence and all
+    entity scores, no confidence, score or entity filtering. The word text is not kept.
+    Each item is a dict with x1 y1 x2 y2 ocr_conf entities=[{label, score}]
+    """
+    analyzer = _get_analyzer(cfg)
+    out: List[Dict] = []
+
+    words = _ocr_words(img_rgb, cfg)
+    for word, results in zip(words, _word_results(words, cfg, analyzer, None)):
+        if not results:
+            continue
+
+        # Keep the best score per entity type
+        best: Dict[str, float] = {}
+        for r in results:
+            if r.score > best.get(r.entity_type, -1.0):
+                best[r.entity_type] = float(r.score)
+
+        out.append({
+            "x1": word["x1"], "y1": word["y1"], "x2": word["x2"], "y2": word["y2"],
+            "ocr_conf": word["conf"],
+            "entities": [{"label": k, "score": v} for k, v in best.items()],
+        })
+
+    return out
+
+_PATTERNS: Dict[tuple, List] = {}
+
+def _compiled_patterns(cfg) -> List:
+    spec = tuple(sorted((cfg.get("patterns") or {}).items()))
+    pats = _PATTERNS.get(spec)
+    if pats is None:
+        pats = [(name, re.compile(rx)) for name, rx in spec]
+        _PATTERNS[spec] = pats
+    return pats
+
+def _match_pattern(text: str, pats: List) -> str:
+    for name, rx in pats:
+        if rx.search(text):
+            return name
+    return ""
+
+def find_text_regex(img_rgb: np.ndarray, cfg) -> List[Dict]:
+    """
+    Fast text path, OCR words matched against cfg["patterns"] only, no analyzer.
+    Each box is a dict with x1 y1 x2 y2 label score, label is the pattern name and score is 1.0
+    """
+    pats = _compiled_patterns(cfg)
+    if not pats:
+        return []
+    _set_tesseract_cmd(cfg)
+    min_conf = int(cfg.get("ocr", {}).get("min_confidence", 50))
+    out: List[Dict] = []
+
+    for word in _ocr_words(img_rgb, cfg):
+        conf = word["conf"]
+        if conf >= 0 and conf < min_conf:
+            continue
+        name = _match_pattern(word["text"], pats)
+        if name:
+            out.append({
+                "x1": word["x1"], "y1": word["y1"], "x2": word["x2"], "y2": word["y2"],
+                "label": name,
+                "score": 1.0,
+            })
+
+    return out
@@ -0,0 +1,159 @@
+from __future__ import annotations
+from typing import Dict, Any, Tuple, Optional
+import math
+import re
+import numpy as np
+import cv2
+import pytesseract
+
+# Skew search runs on at most this many foreground pixels of a thumbnail at most _SKEW_SIDE wide
+_SKEW_POINTS = 20000
+_SKEW_SIDE = 800
+# the best angle must beat the unrotated projection by this factor, photos without text lines stay put
+_SKEW_MIN_GAIN = 1.05
+
+
+def _prep_cfg(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    ocr_cfg = cfg.get("ocr", {}) or {}
+    p = ocr_cfg.get("preprocess", {}) or {}
+    block = int(p.get("block_size", 31)) | 1  # adaptive threshold needs an odd window
+    return {
+        "scale": float(ocr_cfg.get("scale", 1.0)),
+        "binarize": bool(p.get("binarize", False)),
+        "block_size": max(3, block),
+        "offset": float(p.get("offset", 15)),
+        "deskew": bool(p.get("deskew", False)),
+        "max_skew": float(p.get("max_skew", 15.0)),
+        "skew_step": float(p.get("skew_step", 0.5)),
+        "orientation": bool(p.get("orientation", False)),
+    }
+
+
+def to_gray(img: np.ndarray) -> np.ndarray:
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(np.ascontiguousarray(img), cv2.COLOR_RGB2GRAY)
+
+
+def estimate_skew(gray: np.ndarray, max_angle: float = 15.0, step: float = 0.5) -> float:
+    """
+    Text-line skew in degrees, counter-clockwise positive as in cv2.getRotationMatrix2D.
+    Dark pixels are projected onto the vertical axis for every candidate angle at once, the angle
+    whose row histogram is most peaked (sum of squares) wins. 0 when no angle clearly beats 0.
+    """
+    h, w = gray.shape[:2]
+    k = min(1.0, _SKEW_SIDE / max(h, w))
+    small = gray if k == 1.0 else cv2.resize(gray, (max(1, round(w * k)), max(1, round(h * k))), interpolation=cv2.INTER_AREA)
+    ink = cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+    ys, xs = np.nonzero(ink)
+    if len(xs) < 100:
+        return 0.0
+    if len(xs) > _SKEW_POINTS:
+        pick = np.random.default_rng(0).choice(len(xs), _SKEW_POINTS, replace=False)
+        xs, ys = xs[pick], ys[pick]
+
+    sh, sw = small.shape[:2]
+    xc = xs.astype(np.float64) - sw / 2.0
+    yc = ys.astype(np.float64) - sh / 2.0
+    degs = np.arange(-max_angle, max_angle + step / 2.0, step)
+    rad = np.deg2rad(degs)
+    # row of each point after cv2's rotation by each angle: y' = -sin(a) x + cos(a) y
+    rows = np.rint(np.outer(np.cos(rad), yc) - np.outer(np.sin(rad), xc)).astype(np.int64)
+    nb = int(math.hypot(sh, sw)) + 3
+    rows += nb // 2 + np.arange(len(degs))[:, None] * nb
+    hist = np.bincount(rows.ravel(), minlength=len(degs) * nb).reshape(len(degs), nb).astype(np.float64)
+    score = (hist * hist).sum(axis=1)
+
+    best = int(np.argmax(score))
+    zero = int(np.argmin(np.abs(degs)))
+    if score[best] < score[zero] * _SKEW_MIN_GAIN:
+        return 0.0
+    return float(degs[best])
+
+
+def tesseract_osd(gray: np.ndarray) -> Dict[str, Any]:
+    """
+    Tesseract OSD as {"rotate": clockwise degrees the page needs, "script": name or None},
+    {"rotate": 0, "script": None} when OSD is unavailable or unsure.
+    """
+    try:
+        osd = pytesseract.image_to_osd(gray)
+    except Exception:
+        # missing osd.traineddata or too little text
+        return {"rotate": 0, "script": None}
+    rot = re.search(r"Rotate:\s*(\d+)", osd)
+    script = re.search(r"Script:\s*(\w+)", osd)
+    return {"rotate": int(rot.group(1)) % 360 if rot else 0, "script": script.group(1) if script else None}
+
+
+def preprocess_for_ocr(
+    img: np.ndarray, cfg: Dict[str, Any], want_script: bool = False
+) -> Tuple[np.ndarray, np.ndarray, Optional[str]]:
+    """
+    Single-channel 8-bit buffer for Tesseract, the 2x3 affine that maps its pixels back to img, and
+    the script Tesseract OSD reports (None unless orientation or want_script asked for OSD).
+
+    Steps, each under cfg["ocr"]["preprocess"]: grayscale always; ocr.scale, deskew (projection
+    profile search within max_skew) and orientation (Tesseract OSD) folded into one warp with a
+    white border; then adaptive Gaussian binarization with block_size and offset.
+    OSD runs at most once, on the scaled grayscale before binarization.
+    """
+    pc = _prep_cfg(cfg)
+    gray = to_gray(img)
+    h, w = gray.shape[:2]
+    scale = pc["scale"] if 0 < pc["scale"] < 1 else 1.0
+
+    angle = estimate_skew(gray, pc["max_skew"], pc["skew_step"]) if pc["deskew"] else 0.0
+    script = None
+    if pc["orientation"] or want_script:
+        small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        osd = tesseract_osd(small)
+        script = osd["script"]
+        if pc["orientation"]:
+            # cv2 angles are counter-clockwise, OSD reports clockwise
+            angle -= osd["rotate"]
+
+    if angle == 0.0 and scale == 1.0:
+        out = gray
+        fwd = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    elif angle == 0.0:
+        out = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+        fwd = np.array([[out.shape[1] / w, 0.0, 0.0], [0.0, out.shape[0] / h, 0.0]])
+    else:
+        fwd = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, scale)
+        c, s = abs(fwd[0, 0]), abs(fwd[0, 1])
+        nw, nh = int(math.ceil(h * s + w * c)), int(math.ceil(h * c + w * s))
+        # grow the canvas so rotated corners are kept
+        fwd[0, 2] += nw / 2.0 - w / 2.0
+        fwd[1, 2] += nh / 2.0 - h / 2.0
+        out = cv2.warpAffine(gray, fwd, (nw, nh), flags=cv2.INTER_LINEAR, borderValue=255)
+
+    if pc["binarize"]:
+        out = cv2.adaptiveThreshold(
+            out, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, pc["block_size"], pc["offset"]
+        )
+    return np.ascontiguousarray(out), cv2.invertAffineTransform(fwd), script
+
+
+def map_boxes_back(
+    left: np.ndarray, top: np.ndarray, width: np.ndarray, height: np.ndarray, inv: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sends word rectangles from the preprocessed buffer back through the inverse affine.
+    Returns x1 y1 x2 y2 of the axis-aligned hull of each rotated rectangle, unclamped.
+    """
+    xs = np.stack([left, left + width, left, left + width], axis=1).astype(np.float64)
+    ys = np.stack([top, top, top + height, top + height], axis=1).astype(np.float64)
+    bx = inv[0, 0] * xs + inv[0, 1] * ys + inv[0, 2]
+    by = inv[1, 0] * xs + inv[1, 1] * ys + inv[1, 2]
+    return (
+        np.floor(bx.min(axis=1)).astype(np.int64),
+        np.floor(by.min(axis=1)).astype(np.int64),
+        np.ceil(bx.max(axis=1)).astype(np.int64),
+        np.ceil(by.max(axis=1)).astype(np.int64),
+    )
+
+
+def preprocess_signature(cfg: Dict[str, Any]) -> str:
+    pc = _prep_cfg(cfg)
+    return ",".join(f"{k}={pc[k]}" for k in sorted(pc))
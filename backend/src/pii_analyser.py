@@ -9,13 +9,14 @@ from presidio_analyzer.nlp_engine import NlpEngineProvider
 _ONNXR_AVAILABLE = True
 try:
     import onnxruntime as ort
-    from transformers import AutoTokenizer
+    # Rust tokenizers directly, importing transformers costs seconds at startup
+    from tokenizers import Tokenizer
 except Exception:
     _ONNXR_AVAILABLE = False
 
 # Constants
 LABEL_MAP = {"PER": "PERSON", "ORG": "ORGANIZATION", "LOC": "LOCATION", "MISC": "NRP"}
-REQ_TOKENIZER_FILES = ("tokenizer.json", "tokenizer_config.json", "special_tokens_map.json")
+REQ_TOKENIZER_FILES = ("tokenizer.json",)
 
 
 def _softmax(x: np.ndarray, axis: int = -1) -> np.ndarray:
@@ -24,6 +25,25 @@ def _softmax(x: np.ndarray, axis: int = -1) -> np.ndarray:
     return e / np.sum(e, axis=axis, keepdims=True)
 
 
+def _merge_windows(probs: np.ndarray, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merges per-window token probabilities [n_win, seq_len, num_labels] into one row per
+    character span, averaging tokens seen by several overlapping windows.
+    Special and padding tokens (empty spans) are dropped. Spans come back sorted by start.
+    """
+    valid = offsets[..., 1] > offsets[..., 0]
+    spans = offsets[valid]
+    p = probs[valid]
+    if not len(spans):
+        return np.zeros((0, probs.shape[-1]), dtype=probs.dtype), np.zeros((0, 2), dtype=np.int64)
+    uniq, inv = np.unique(spans, axis=0, return_inverse=True)
+    inv = inv.reshape(-1)
+    summed = np.zeros((len(uniq), p.shape[-1]), dtype=np.float64)
+    np.add.at(summed, inv, p)
+    counts = np.bincount(inv, minlength=len(uniq))
+    return summed / counts[:, None], uniq
+
+
 def _load_id2label(labels_path: Optional[str], cfg_path: Optional[str]) -> Dict[int, str]:
     # labels.txt preferred
     if labels_path and os.path.isfile(labels_path):
@@ -58,10 +78,14 @@ class DistilBertOnnxRecognizer(EntityRecognizer):
         score_threshold: float = 0.60,
         device: int = -1,
         max_length: int = 256,
+        stride: int = 64,
+        max_batch: int = 16,
+        intra_op_threads: Optional[int] = None,
+        inter_op_threads: int = 1,
         allow_download: bool = True,
     ):
         if not _ONNXR_AVAILABLE:
-            raise RuntimeError("onnxruntime or transformers not available")
+            raise RuntimeError("onnxruntime or tokenizers not available")
 
         if supported_entities is None:
             supported_entities = ["PERSON", "ORGANIZATION", "LOCATION", "NRP"]
@@ -74,33 +98,43 @@ class DistilBertOnnxRecognizer(EntityRecognizer):
 
         self.score_threshold = score_threshold
         self.max_length = max_length
+        # tokens shared by neighbouring windows, long texts are scanned in full instead of truncated
+        self.stride = max(0, min(int(stride), max_length // 2))
+        self.max_batch = max(1, int(max_batch))
         self.group2presidio = LABEL_MAP
 
         if not os.path.isfile(onnx_path) or not onnx_path.lower().endswith(".onnx"):
             raise FileNotFoundError(f"Invalid ONNX model path: {onnx_path}")
 
-        # Resolve tokenizer
+        # Resolve tokenizer, a local tokenizer.json first, the hub only when downloads are allowed
         target_tok = tokenizer_path or model_id_fallback
-        tok_kwargs: Dict[str, Any] = {}
-        if not allow_download:
-            tok_kwargs["local_files_only"] = True
-            if os.path.isdir(target_tok):
-                missing = [
-                    p for p in REQ_TOKENIZER_FILES
-                    if not os.path.isfile(os.path.join(target_tok, p)) or os.path.getsize(os.path.join(target_tok, p)) == 0
-                ]
-                if missing:
-                    raise RuntimeError(f"TOKENIZER_PATH missing or empty: {missing} in {target_tok}")
-            elif os.path.sep in target_tok:
-                raise RuntimeError(f"TOKENIZER_PATH directory not found: {target_tok}")
-
-        self.tokenizer = AutoTokenizer.from_pretrained(target_tok, **tok_kwargs)
+        if os.path.isdir(target_tok):
+            missing = [
+                p for p in REQ_TOKENIZER_FILES
+                if not os.path.isfile(os.path.join(target_tok, p)) or os.path.getsize(os.path.join(target_tok, p)) == 0
+            ]
+            if missing:
+                raise RuntimeError(f"TOKENIZER_PATH missing or empty: {missing} in {target_tok}")
+            self.tokenizer = Tokenizer.from_file(os.path.join(target_tok, "tokenizer.json"))
+        elif os.path.isfile(target_tok):
+            self.tokenizer = Tokenizer.from_file(target_tok)
+        elif os.path.sep in target_tok:
+            raise RuntimeError(f"TOKENIZER_PATH directory not found: {target_tok}")
+        elif not allow_download:
+            raise RuntimeError(f"Tokenizer {target_tok} is not local and downloads are disabled")
+        else:
+            self.tokenizer = Tokenizer.from_pretrained(target_tok)
+
+        # Windows overlap by stride tokens, padding is done per batch in _encode_windows
+        self.tokenizer.enable_truncation(max_length=self.max_length, stride=self.stride)
+        self.tokenizer.no_padding()
+        self.pad_id = self.tokenizer.token_to_id("[PAD]") or 0
 
         # ONNX session
         so = ort.SessionOptions()
         so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-        so.inter_op_num_threads = 1
-        so.intra_op_num_threads = max(1, (os.cpu_count() or 4) - 1)
+        so.inter_op_num_threads = max(1, int(inter_op_threads))
+        so.intra_op_num_threads = max(1, int(intra_op_threads or (os.cpu_count() or 4) - 1))
         providers = ["CPUExecutionProvider"] if device == -1 else ["CUDAExecutionProvider", "CPUExecutionProvider"]
         self.sess = ort.InferenceSession(onnx_path, sess_options=so, providers=providers)
 
@@ -117,6 +151,28 @@ class DistilBertOnnxRecognizer(EntityRecognizer):
             i: lab for i, lab in enumerate(["O", "B-MISC", "I-MISC", "B-PER", "I-PER", "B-ORG", "I-ORG", "B-LOC", "I-LOC"])
         }
 
+    def _encode_windows(self, text: str) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Tokenizes text into overlapping windows padded to a common length.
+        Returns model inputs by name and offsets [n_win, seq_len, 2], padding has empty offsets.
+        """
+        first = self.tokenizer.encode(text)
+        wins = [first] + list(first.overflowing)
+        n, seq_len = len(wins), max(len(w.ids) for w in wins)
+
+        input_ids = np.full((n, seq_len), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((n, seq_len), dtype=np.int64)
+        token_type_ids = np.zeros((n, seq_len), dtype=np.int64)
+        offsets = np.zeros((n, seq_len, 2), dtype=np.int64)
+        for i, w in enumerate(wins):
+            k = len(w.ids)
+            input_ids[i, :k] = w.ids
+            attention_mask[i, :k] = w.attention_mask
+            token_type_ids[i, :k] = w.type_ids
+            offsets[i, :k] = w.offsets
+        enc = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+        return enc, offsets
+
     def _to_inputs(self, enc: Dict[str, Any]) -> Dict[str, np.ndarray]:
         out: Dict[str, np.ndarray] = {}
         for name in self.input_names:
@@ -173,20 +229,19 @@ class DistilBertOnnxRecognizer(EntityRecognizer):
         if not text or not entities or self.sess is None:
             return []
 
-        enc = self.tokenizer(
-            text,
-            return_tensors="np",
-            return_offsets_mapping=True,
-            truncation=True,
-            max_length=self.max_length,
-        )
-        offsets = [tuple(map(int, o)) for o in enc.pop("offset_mapping")[0]]
+        enc, offsets_win = self._encode_windows(text)  # offsets [n_win, seq_len, 2]
         ort_inputs = self._to_inputs(enc)
 
-        logits = self.sess.run([self.output_name], ort_inputs)[0]  # [1, seq_len, num_labels]
-        probs = _softmax(logits, axis=-1)
-        ids = probs.argmax(axis=-1)[0]
-        conf = probs.max(axis=-1)[0]
+        # All windows in as few runs as max_batch allows
+        n_win = offsets_win.shape[0]
+        logits = np.concatenate([
+            self.sess.run([self.output_name], {k: v[i:i + self.max_batch] for k, v in ort_inputs.items()})[0]
+            for i in range(0, n_win, self.max_batch)
+        ], axis=0)  # [n_win, seq_len, num_labels]
+        probs, spans_off = _merge_windows(_softmax(logits, axis=-1), offsets_win)
+        ids = probs.argmax(axis=-1)
+        conf = probs.max(axis=-1)
+        offsets = [tuple(o) for o in spans_off.tolist()]
 
         spans = self._aggregate(ids=ids, scores=conf, offsets=offsets)
 
@@ -198,13 +253,26 @@ class DistilBertOnnxRecognizer(EntityRecognizer):
         return out
 
 
-def build_analyzer(spacy_model: str = "en_core_web_lg", use_distilbert: bool = True) -> AnalyzerEngine:
-    nlp_conf = {"nlp_engine_name": "spacy", "models": [{"lang_code": "en", "model_name": spacy_model}]}
+def build_analyzer(
+    spacy_model: str = "en_core_web_lg", use_distilbert: bool = True, language: str = "en",
+    cfg: Optional[Dict[str, Any]] = None,
+) -> AnalyzerEngine:
+    """
+    spaCy analyzer for language, plus the DistilBERT ONNX recognizer for English when use_distilbert.
+
+    Config keys supported under cfg["pii"]["distilbert"], environment wins over config:
+      max_length: int   HF_MAX_LEN, tokens per window, default 256
+      stride: int       HF_STRIDE, tokens shared by neighbouring windows, default 64
+      max_batch: int    HF_MAX_BATCH, windows per ONNX run, default 16
+    """
+    db_cfg = ((cfg or {}).get("pii", {}) or {}).get("distilbert") or {}
+    nlp_conf = {"nlp_engine_name": "spacy", "models": [{"lang_code": language, "model_name": spacy_model}]}
     provider = NlpEngineProvider(nlp_configuration=nlp_conf)
     nlp_engine = provider.create_engine()
-    analyzer = AnalyzerEngine(nlp_engine=nlp_engine, supported_languages=["en"])
+    analyzer = AnalyzerEngine(nlp_engine=nlp_engine, supported_languages=[language])
 
-    if use_distilbert:
+    # the DistilBERT model is English only
+    if use_distilbert and language == "en":
         try:
             db = DistilBertOnnxRecognizer(
                 onnx_path=os.getenv("ONNX_MODEL_PATH"),
@@ -213,7 +281,12 @@ def build_analyzer(spacy_model: str = "en_core_web_lg", use_distilbert: bool = T
                 config_path=os.getenv("NER_CONFIG_PATH"),
                 score_threshold=0.60,
                 device=int(os.getenv("HF_NER_DEVICE", "-1")),
-                max_length=int(os.getenv("HF_MAX_LEN", "256")),
+                max_length=int(os.getenv("HF_MAX_LEN") or db_cfg.get("max_length", 256)),
+                stride=int(os.getenv("HF_STRIDE") or db_cfg.get("stride", 64)),
+                max_batch=int(os.getenv("HF_MAX_BATCH") or db_cfg.get("max_batch", 16)),
+                # set by resources.apply_cpu_budget, so workers do not oversubscribe the node
+                intra_op_threads=int(os.getenv("ORT_INTRA_OP_THREADS", "0")) or None,
+                inter_op_threads=int(os.getenv("ORT_INTER_OP_THREADS", "1")),
                 allow_download=os.getenv("HF_ALLOW_DOWNLOAD", "true").lower() == "true",
             )
             analyzer.registry.add_recognizer(db)
@@ -21,10 +21,13 @@ def _ensure_uint8_rgb(arr: np.ndarray) -> np.ndarray:
         arr = np.ascontiguousarray(arr)
     return arr
 
-def apply_redactions(img_rgb: np.ndarray, boxes: List[Dict], cfg: Dict[str, Any]) -> Tuple[np.ndarray, bool]:
+def apply_redactions(
+    img_rgb: np.ndarray, boxes: List[Dict], cfg: Dict[str, Any], inplace: bool = False
+) -> Tuple[np.ndarray, bool]:
     """
     Returns (redacted_image_rgb, applied_flag).
     Reads redaction settings from cfg["redaction"].
+    With inplace a contiguous uint8 img_rgb is redacted and returned as is, no copy is made.
 
     Config keys supported:
       style: "fill" or "blur" or "box"  default "fill"
@@ -41,7 +44,7 @@ def apply_redactions(img_rgb: np.ndarray, boxes: List[Dict], cfg: Dict[str, Any]
         return img_rgb, False
 
     h, w = img_rgb.shape[:2]
-    out = img_rgb.copy()
+    out = img_rgb if inplace else img_rgb.copy()
     fill_col = [0, 0, 0]
     fill_col = np.array([int(max(0, min(255, c))) for c in fill_col], dtype=np.uint8)
 
@@ -0,0 +1,277 @@
+from __future__ import annotations
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from dataclasses import dataclass
+import threading
+import time
+import numpy as np
+import cv2
+
+from .lp_detector import detect_license_plates, detect_license_plate_candidates
+from .ocr import find_text_pii, find_text_candidates
+
+
+# ---------- Detector registry, shared input views, parallel runs ----------
+
+@dataclass(frozen=True)
+class ViewSpec:
+    """
+    Input a detector needs. color is "rgb", "bgr" or "gray", max_side downscales the long side.
+    Detectors asking for the same spec get the same array.
+    """
+    color: str = "rgb"
+    max_side: Optional[int] = None
+
+
+@dataclass
+class Box:
+    x1: int
+    y1: int
+    x2: int
+    y2: int
+    label: str
+    score: Optional[float]
+    source: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"x1": self.x1, "y1": self.y1, "x2": self.x2, "y2": self.y2, "label": self.label, "score": self.score}
+
+
+@dataclass
+class Detector:
+    """
+    name: unique key, also the Box.source of its results
+    view: the input it needs
+    fn: fn(view_array, cfg) -> list of {x1, y1, x2, y2, label, score} in view coordinates
+    gate: scene gate branch that can skip it, "lp", "text" or None
+    candidates: policy-free variant of fn for the detection store, items carry x1 y1 x2 y2 plus
+        whatever select needs. Without it fn's boxes are stored and reused as they are.
+    select: select(items, cfg) -> boxes, applies the current policy to stored candidates
+    """
+    name: str
+    view: ViewSpec
+    fn: Callable[[np.ndarray, Dict[str, Any]], List[Dict[str, Any]]]
+    gate: Optional[str] = None
+    candidates: Optional[Callable[[np.ndarray, Dict[str, Any]], List[Dict[str, Any]]]] = None
+    select: Optional[Callable[[List[Dict[str, Any]], Dict[str, Any]], List[Dict[str, Any]]]] = None
+
+
+_REGISTRY: Dict[str, Callable[[Dict[str, Any]], Detector]] = {}
+
+
+def register_detector(name: str, factory: Callable[[Dict[str, Any]], Detector]) -> None:
+    """
+    Registers a detector factory, called with the config so the view can depend on it.
+    Detectors run when listed in cfg["detectors"]["enabled"].
+    """
+    _REGISTRY[name] = factory
+
+
+def enabled_detectors(cfg: Dict[str, Any]) -> List[Detector]:
+    names = (cfg.get("detectors", {}) or {}).get("enabled") or ["license_plate", "text_pii"]
+    missing = [n for n in names if n not in _REGISTRY]
+    if missing:
+        raise KeyError(f"Unknown detectors {missing}, registered: {sorted(_REGISTRY)}")
+    return [_REGISTRY[n](cfg) for n in names]
+
+
+class ViewCache:
+    """
+    Preprocessed views of one image, each computed once. Resizing happens before color conversion.
+    """
+
+    def __init__(self, img_rgb: np.ndarray):
+        self.img_rgb = img_rgb
+        self._views: Dict[ViewSpec, Tuple[np.ndarray, float]] = {}
+
+    def get(self, spec: ViewSpec) -> Tuple[np.ndarray, float]:
+        """
+        Returns (array, scale), scale maps view coordinates back by division.
+        """
+        hit = self._views.get(spec)
+        if hit is not None:
+            return hit
+
+        if spec.color == "rgb" and spec.max_side is None:
+            view, scale = self.img_rgb, 1.0
+        elif spec.color != "rgb":
+            base, scale = self.get(ViewSpec("rgb", spec.max_side))
+            code = cv2.COLOR_RGB2GRAY if spec.color == "gray" else cv2.COLOR_RGB2BGR
+            view = cv2.cvtColor(np.ascontiguousarray(base), code)
+        else:
+            h, w = self.img_rgb.shape[:2]
+            scale = min(1.0, spec.max_side / max(h, w))
+            if scale == 1.0:
+                view = self.img_rgb
+            else:
+                size = (max(1, round(w * scale)), max(1, round(h * scale)))
+                view = cv2.resize(self.img_rgb, size, interpolation=cv2.INTER_AREA)
+        self._views[spec] = (view, scale)
+        return view, scale
+
+
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool(cfg: Dict[str, Any]) -> ThreadPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            workers = int((cfg.get("detectors", {}) or {}).get("workers", 4))
+            _POOL = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="detector")
+        return _POOL
+
+
+def _run_one(det: Detector, views: ViewCache, cfg: Dict[str, Any], candidates: bool) -> Tuple[List[Any], float]:
+    t0 = time.perf_counter()
+    view, scale = views.get(det.view)
+    h, w = views.img_rgb.shape[:2]
+    fn = (det.candidates or det.fn) if candidates else det.fn
+    out = []
+    for b in fn(view, cfg):
+        coords = dict(
+            x1=int(b["x1"] / scale),
+            y1=int(b["y1"] / scale),
+            x2=min(w - 1, int(np.ceil(b["x2"] / scale))),
+            y2=min(h - 1, int(np.ceil(b["y2"] / scale))),
+        )
+        if candidates:
+            out.append(dict(b, **coords))
+        else:
+            out.append(Box(**coords, label=b.get("label", det.name), score=b.get("score"), source=det.name))
+    return out, (time.perf_counter() - t0) * 1000.0
+
+
+def _run_all(
+    img_rgb: np.ndarray, cfg: Dict[str, Any], skip: Optional[set], candidates: bool, gates: Optional[set] = None
+) -> Tuple[Dict[str, List[Any]], Dict[str, float]]:
+    skip = skip or set()
+    dets = [d for d in enabled_detectors(cfg) if d.gate is None or d.gate not in skip]
+    if gates is not None:
+        dets = [d for d in dets if d.gate in gates]
+    views = ViewCache(img_rgb)
+    for d in dets:
+        views.get(d.view)
+
+    out: Dict[str, List[Any]] = {d.name: [] for d in dets}
+    timings: Dict[str, float] = {}
+    if len(dets) == 1:
+        out[dets[0].name], timings[dets[0].name] = _run_one(dets[0], views, cfg, candidates)
+        return out, timings
+
+    # each task runs in a copy of this context, so model versions are recorded for the request
+    futures = [
+        (d, _pool(cfg).submit(contextvars.copy_context().run, _run_one, d, views, cfg, candidates)) for d in dets
+    ]
+    for d, fut in futures:
+        out[d.name], timings[d.name] = fut.result()
+    return out, timings
+
+
+def run_detectors(
+    img_rgb: np.ndarray, cfg: Dict[str, Any], skip: Optional[set] = None, gates: Optional[set] = None
+) -> Tuple[Dict[str, List[Box]], Dict[str, float]]:
+    """
+    Runs every enabled detector on its view in parallel, boxes come back in img_rgb coordinates.
+    Views are built up front so no two threads compute the same one.
+    skip holds scene gate branches ("lp", "text") that were ruled out for this image, gates when
+    given runs only the detectors of those branches.
+    Returns ({detector name: boxes}, {detector name: ms}).
+    """
+    return _run_all(img_rgb, cfg, skip, candidates=False, gates=gates)
+
+
+def run_candidates(
+    img_rgb: np.ndarray, cfg: Dict[str, Any], skip: Optional[set] = None
+) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, float]]:
+    """
+    Same as run_detectors with each detector's policy-free candidates, as plain dicts in
+    img_rgb coordinates, for the detection store. select_candidates applies the policy later.
+    """
+    return _run_all(img_rgb, cfg, skip, candidates=True)
+
+
+def select_candidates(items: Dict[str, List[Dict[str, Any]]], cfg: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Applies the current policy to stored candidates, returns {detector name: boxes}.
+    Items of detectors that are no longer registered are dropped.
+    """
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for name, found in items.items():
+        if name not in _REGISTRY:
+            continue
+        det = _REGISTRY[name](cfg)
+        if det.select is not None:
+            out[name] = det.select(found, cfg)
+        else:
+            out[name] = [
+                {"x1": b["x1"], "y1": b["y1"], "x2": b["x2"], "y2": b["y2"],
+                 "label": b.get("label", name), "score": b.get("score")}
+                for b in found
+            ]
+    return out
+
+
+# ---------- Built-in detectors ----------
+
+def _select_plates(items: List[Dict[str, Any]], cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # same key as the direct path
+    lp_thr = float((cfg.get("lp", {}) or {}).get("score_threshold", 0.25))
+    return [dict(b) for b in items if b.get("score") is None or b["score"] >= lp_thr]
+
+
+def _select_words(items: List[Dict[str, Any]], cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # same keys as find_text_pii: ocr.min_confidence, pii.min_score and pii.entities
+    min_conf = int(cfg.get("ocr", {}).get("min_confidence", 50))
+    pii_cfg = cfg.get("pii", {}) or {}
+    min_score = float(pii_cfg.get("min_score", 0.6))
+    allowed = set(pii_cfg.get("entities") or [])
+
+    out: List[Dict[str, Any]] = []
+    for word in items:
+        conf = int(word.get("ocr_conf", -1))
+        if conf >= 0 and conf < min_conf:
+            continue
+        ents = [e for e in word.get("entities", []) if not allowed or e["label"] in allowed]
+        if not ents:
+            continue
+        best = max(ents, key=lambda e: e["score"])
+        if best["score"] < min_score:
+            continue
+        out.append({
+            "x1": word["x1"], "y1": word["y1"], "x2": word["x2"], "y2": word["y2"],
+            "label": best["label"],
+            "score": float(best["score"]),
+        })
+    return out
+
+
+def _license_plate(cfg: Dict[str, Any]) -> Detector:
+    # hand YOLO the channel order it was trained on, no flip inside the detector
+    color = "bgr" if bool((cfg.get("lp", {}) or {}).get("expects_bgr", False)) else "rgb"
+    return Detector(
+        name="license_plate",
+        view=ViewSpec(color),
+        fn=lambda img, c: detect_license_plates(img, c, channels=color),
+        gate="lp",
+        candidates=lambda img, c: detect_license_plate_candidates(img, c, channels=color),
+        select=_select_plates,
+    )
+
+
+def _text_pii(cfg: Dict[str, Any]) -> Detector:
+    # Tesseract binarizes luminance anyway, a gray view is a third of the bytes to hand over
+    return Detector(
+        name="text_pii",
+        view=ViewSpec("gray"),
+        fn=find_text_pii,
+        gate="text",
+        candidates=find_text_candidates,
+        select=_select_words,
+    )
+
+
+register_detector("license_plate", _license_plate)
+register_detector("text_pii", _text_pii)
@@ -0,0 +1,252 @@
+from typing import List, Dict, Any, Optional, Iterator
+import glob
+import json
+import os
+import threading
+import time
+
+_PARQUET_AVAILABLE = True
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    _PARQUET_AVAILABLE = False
+
+# One row per box, flat so audit jobs can read single columns
+REPORT_COLUMNS = (
+    ("ts", "float64"),
+    ("image_hash", "string"),
+    ("box_index", "int32"),
+    ("x1", "int32"),
+    ("y1", "int32"),
+    ("x2", "int32"),
+    ("y2", "int32"),
+    ("label", "string"),
+    ("score", "float32"),
+    ("t_lp_ms", "float32"),
+    ("t_pii_ms", "float32"),
+    ("t_redact_ms", "float32"),
+    ("t_total_ms", "float32"),
+)
+
+
+def _schema():
+    return pa.schema([(name, pa.type_for_alias(kind)) for name, kind in REPORT_COLUMNS])
+
+
+def meta_to_rows(meta: Dict[str, Any], ts: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Flattens a process_image_np meta dict into report rows.
+    An image without boxes still yields one row with empty box fields, so image counts stay correct.
+    """
+    ts = time.time() if ts is None else ts
+    timings = meta.get("timings_ms") or {}
+    base = {
+        "ts": ts,
+        "image_hash": meta.get("image_hash"),
+        "t_lp_ms": timings.get("lp"),
+        "t_pii_ms": timings.get("pii"),
+        "t_redact_ms": timings.get("redact"),
+        "t_total_ms": timings.get("total"),
+    }
+    boxes = meta.get("boxes") or []
+    if not boxes:
+        return [dict(base, box_index=None, x1=None, y1=None, x2=None, y2=None, label=None, score=None)]
+
+    rows = []
+    for i, b in enumerate(boxes):
+        rows.append(dict(
+            base,
+            box_index=i,
+            x1=int(b["x1"]), y1=int(b["y1"]), x2=int(b["x2"]), y2=int(b["y2"]),
+            label=b.get("label"),
+            score=float(b["score"]) if b.get("score") is not None else None,
+        ))
+    return rows
+
+
+class ReportWriter:
+    """
+    Streams per-image detection records to an append-only JSONL file and rolling Parquet files.
+    Memory is bounded by flush_rows, a Parquet file is closed and a new one started every rows_per_file rows.
+    The open Parquet file is written as *.parquet.tmp and renamed once closed, so readers globbing
+    *.parquet only see complete files. A crashed writer leaves its .tmp behind, it has no footer.
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        jsonl: bool = True,
+        parquet: bool = True,
+        rows_per_file: int = 500_000,
+        flush_rows: int = 10_000,
+    ):
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+
+        self.jsonl_path = os.path.join(out_dir, "redactions.jsonl") if jsonl else None
+        self.parquet = bool(parquet)
+        if self.parquet and not _PARQUET_AVAILABLE:
+            print("[reports] pyarrow not available, Parquet output disabled")
+            self.parquet = False
+
+        self.rows_per_file = max(1, int(rows_per_file))
+        self.flush_rows = max(1, min(int(flush_rows), self.rows_per_file))
+
+        self._lock = threading.Lock()
+        self._jsonl_fh = open(self.jsonl_path, "a", encoding="utf-8") if self.jsonl_path else None
+        self._buffer: List[Dict[str, Any]] = []
+        self._pq_writer = None
+        self._pq_path: Optional[str] = None
+        self._pq_rows = 0
+
+    def _next_parquet_path(self) -> str:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.out_dir, f"redactions-{stamp}-{os.getpid()}-{time.monotonic_ns()}.parquet")
+
+    def _flush_parquet(self) -> None:
+        if not self._buffer:
+            return
+        schema = _schema()
+        cols = {name: [r.get(name) for r in self._buffer] for name, _ in REPORT_COLUMNS}
+        table = pa.Table.from_pydict(cols, schema=schema)
+        self._buffer = []
+
+        if self._pq_writer is None:
+            self._pq_path = self._next_parquet_path()
+            self._pq_writer = pq.ParquetWriter(self._pq_path + ".tmp", schema, compression="zstd")
+            self._pq_rows = 0
+        self._pq_writer.write_table(table)
+        self._pq_rows += table.num_rows
+
+        if self._pq_rows >= self.rows_per_file:
+            self._close_parquet()
+
+    def _close_parquet(self) -> None:
+        self._pq_writer.close()
+        os.replace(self._pq_path + ".tmp", self._pq_path)
+        self._pq_writer = None
+        self._pq_path = None
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows and closes the open Parquet file, so every row written so far
+        is in a complete *.parquet file. The next write starts a new file.
+        """
+        with self._lock:
+            if self.parquet:
+                self._flush_parquet()
+                if self._pq_writer is not None:
+                    self._close_parquet()
+            if self._jsonl_fh is not None:
+                self._jsonl_fh.flush()
+
+    def write(self, meta: Dict[str, Any]) -> None:
+        ts = time.time()
+        with self._lock:
+            if self._jsonl_fh is not None:
+                rec = {
+                    "ts": ts,
+                    "image_hash": meta.get("image_hash"),
+                    "boxes": meta.get("boxes") or [],
+                    "counts": meta.get("counts") or {},
+                    "timings_ms": meta.get("timings_ms") or {},
+                }
+                self._jsonl_fh.write(json.dumps(rec, separators=(",", ":")) + "\n")
+                self._jsonl_fh.flush()
+
+            if self.parquet:
+                self._buffer.extend(meta_to_rows(meta, ts))
+                if len(self._buffer) >= self.flush_rows:
+                    self._flush_parquet()
+
+    def close(self) -> None:
+        with self._lock:
+            if self.parquet:
+                self._flush_parquet()
+                if self._pq_writer is not None:
+                    self._close_parquet()
+            if self._jsonl_fh is not None:
+                self._jsonl_fh.close()
+                self._jsonl_fh = None
+
+
+def build_report_writer(cfg: Dict[str, Any]) -> Optional[ReportWriter]:
+    """
+    Builds a writer from cfg["report"], returns None when reporting is disabled.
+
+    Config keys supported:
+      enabled: bool                 default False
+      dir: output folder            default cfg["io"]["results_rpt_dir"]
+      jsonl: bool                   default True
+      parquet: bool                 default True
+      rows_per_file: int            default 500000
+      flush_rows: int               default 10000
+    """
+    rpt_cfg = cfg.get("report", {}) or {}
+    if not bool(rpt_cfg.get("enabled", False)):
+        return None
+    out_dir = rpt_cfg.get("dir") or (cfg.get("io") or {}).get("results_rpt_dir") or "backend/results/reports"
+    return ReportWriter(
+        out_dir=out_dir,
+        jsonl=bool(rpt_cfg.get("jsonl", True)),
+        parquet=bool(rpt_cfg.get("parquet", True)),
+        rows_per_file=int(rpt_cfg.get("rows_per_file", 500_000)),
+        flush_rows=int(rpt_cfg.get("flush_rows", 10_000)),
+    )
+
+
+# ---------- Query helpers ----------
+
+def _iter_jsonl_boxes(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for ln in f:
+            ln = ln.strip()
+            if not ln:
+                continue
+            try:
+                rec = json.loads(ln)
+            except json.JSONDecodeError:
+                # tolerate a torn last line from a crashed writer
+                continue
+            yield from rec.get("boxes") or []
+
+
+def label_counts(
+    report_dir: str, min_score: Optional[float] = None, writer: Optional[ReportWriter] = None
+) -> Dict[str, int]:
+    """
+    Counts redacted boxes per label across a report folder.
+    Reads only the label and score columns from Parquet when available, else streams the JSONL.
+    Parquet files still open in a ReportWriter end in .tmp and are skipped, pass the live writer
+    to flush its buffered rows and open file first. Boxes without a score always count, with
+    either backend.
+    """
+    if writer is not None:
+        writer.flush()
+    files = sorted(glob.glob(os.path.join(report_dir, "redactions-*.parquet")))
+    counts: Dict[str, int] = {}
+
+    if files and _PARQUET_AVAILABLE:
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(files, format="parquet", schema=_schema())
+        flt = ds.field("label").is_valid()
+        if min_score is not None:
+            flt = flt & (ds.field("score").is_null() | (ds.field("score") >= float(min_score)))
+        for batch in dataset.to_batches(columns=["label"], filter=flt):
+            vc = pc.value_counts(batch.column(0))
+            for item in vc.to_pylist():
+                counts[item["values"]] = counts.get(item["values"], 0) + int(item["counts"])
+        return counts
+
+    jsonl_path = os.path.join(report_dir, "redactions.jsonl")
+    if not os.path.isfile(jsonl_path):
+        return counts
+    for b in _iter_jsonl_boxes(jsonl_path):
+        lab, sc = b.get("label"), b.get("score")
+        if not lab or (min_score is not None and sc is not None and sc < min_score):
+            continue
+        counts[lab] = counts.get(lab, 0) + 1
+    return counts
@@ -0,0 +1,205 @@
+from typing import Dict, Any, List, Optional
+import argparse
+import os
+import time
+
+# Environment knobs read by the native libraries, set before they spin up their pools
+_OMP_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+_APPLIED: Optional[Dict[str, Any]] = None
+
+
+def _visible_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 4
+
+
+def cpu_budget(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Splits the node's cores across API workers and, inside a worker, across ONNX, torch and Tesseract.
+    Stages of one request run one after another, so each library gets the whole per-worker share.
+
+    Config keys supported under cfg["cpu"], environment wins over config:
+      cores: int               BLEEP_CPU_CORES, default all visible cores
+      workers: int             BLEEP_WORKERS or WEB_CONCURRENCY, default 1
+      onnx_intra: int          default per-worker share
+      onnx_inter: int          default 1
+      torch_threads: int       default per-worker share
+      tesseract_threads: int   OMP_THREAD_LIMIT of the Tesseract subprocesses only, default 1
+      cv2_threads: int         cv2.setNumThreads, default per-worker share
+      pin: bool                BLEEP_CPU_PIN, pin each worker to its own cores, default False,
+                               needs BLEEP_WORKER_INDEX per process when workers > 1
+    onnx_* only matter where the DistilBERT recognizer is built (build_analyzer(use_distilbert=True)),
+    the API's analyzers are spaCy only.
+    """
+    cpu_cfg = cfg.get("cpu", {}) or {}
+    cores = int(os.getenv("BLEEP_CPU_CORES") or cpu_cfg.get("cores") or _visible_cores())
+    workers = int(os.getenv("BLEEP_WORKERS") or os.getenv("WEB_CONCURRENCY") or cpu_cfg.get("workers") or 1)
+    workers = max(1, workers)
+    share = max(1, cores // workers)
+    pin_env = os.getenv("BLEEP_CPU_PIN")
+    return {
+        "cores": cores,
+        "workers": workers,
+        "per_worker": share,
+        "onnx_intra": int(cpu_cfg.get("onnx_intra") or share),
+        "onnx_inter": int(cpu_cfg.get("onnx_inter") or 1),
+        "torch_threads": int(cpu_cfg.get("torch_threads") or share),
+        "tesseract_threads": int(cpu_cfg.get("tesseract_threads") or 1),
+        "cv2_threads": int(cpu_cfg.get("cv2_threads") or share),
+        "pin": (pin_env.lower() == "true") if pin_env else bool(cpu_cfg.get("pin", False)),
+    }
+
+
+def _worker_slot(workers: int) -> Optional[int]:
+    # uvicorn does not number its workers, a pid guess would put several on the same cores
+    if os.getenv("BLEEP_WORKER_INDEX"):
+        return int(os.environ["BLEEP_WORKER_INDEX"]) % workers
+    return 0 if workers == 1 else None
+
+
+def limit_tesseract_threads(threads: int) -> None:
+    """
+    Runs the pytesseract subprocesses with OMP_THREAD_LIMIT=threads. The variable stays out of
+    os.environ, libgomp reads it process-wide and would cap torch's OpenMP pool as well.
+    """
+    try:
+        from pytesseract import pytesseract as pt
+    except ImportError:
+        return
+    base = getattr(pt.subprocess_args, "_base", pt.subprocess_args)
+
+    def subprocess_args(include_stdout=True):
+        kwargs = base(include_stdout)
+        kwargs["env"] = dict(kwargs.get("env") or os.environ, OMP_THREAD_LIMIT=str(threads))
+        return kwargs
+
+    subprocess_args._base = base
+    pt.subprocess_args = subprocess_args
+
+
+def apply_cpu_budget(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Applies cpu_budget to this process once: OpenMP/BLAS env vars, OMP_THREAD_LIMIT for the
+    Tesseract subprocesses (limit_tesseract_threads), ORT_* vars read by build_analyzer, cv2's
+    thread count and optional core pinning. The env vars are read when numpy, cv2 and torch load their native pools, so
+    call this before importing any of them.
+    torch picks its share up in configure_torch_threads when the YOLO model loads.
+    """
+    global _APPLIED
+    if _APPLIED is not None:
+        return _APPLIED
+
+    b = cpu_budget(cfg)
+    for var in _OMP_VARS:
+        os.environ[var] = str(b["torch_threads"])
+    os.environ["ORT_INTRA_OP_THREADS"] = str(b["onnx_intra"])
+    os.environ["ORT_INTER_OP_THREADS"] = str(b["onnx_inter"])
+
+    try:
+        import cv2
+        cv2.setNumThreads(b["cv2_threads"])
+    except ImportError:
+        pass
+    limit_tesseract_threads(b["tesseract_threads"])
+
+    if b["pin"] and hasattr(os, "sched_setaffinity"):
+        slot = _worker_slot(b["workers"])
+        if slot is None:
+            print(
+                f"[cpu] WARNING pin requested for {b['workers']} workers but BLEEP_WORKER_INDEX is not set, "
+                "not pinning. Start each worker with its own BLEEP_WORKER_INDEX to pin."
+            )
+            b["pin"] = False
+        else:
+            avail = sorted(os.sched_getaffinity(0))
+            mine = avail[slot * b["per_worker"]:(slot + 1) * b["per_worker"]] or avail
+            os.sched_setaffinity(0, mine)
+            b["pinned_cores"] = mine
+
+    print(
+        f"[cpu] cores={b['cores']} workers={b['workers']} onnx={b['onnx_intra']}/{b['onnx_inter']} "
+        f"torch={b['torch_threads']} cv2={b['cv2_threads']} tesseract={b['tesseract_threads']} pin={b['pin']}"
+    )
+    _APPLIED = b
+    return b
+
+
+def configure_torch_threads() -> None:
+    if _APPLIED is None:
+        return
+    import torch
+    torch.set_num_threads(_APPLIED["torch_threads"])
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # only allowed before the first parallel op, keep whatever is set
+        pass
+
+
+# ---------- Sweep: find the best worker/thread split for this machine ----------
+
+def _sweep_worker(args) -> int:
+    cfg, image_path, threads, seconds = args
+    cfg = dict(cfg)
+    cfg["cpu"] = dict(cfg.get("cpu") or {}, workers=1, cores=threads)
+    apply_cpu_budget(cfg)
+
+    import numpy as np
+    from PIL import Image
+    from .detection import process_image_np
+
+    img = np.array(Image.open(image_path).convert("RGB"))
+    process_image_np(img, cfg)  # warm up models
+    done = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        process_image_np(img, cfg)
+        done += 1
+    return done
+
+
+def sweep(cfg: Dict[str, Any], image_path: str, seconds: float = 30.0) -> List[Dict[str, Any]]:
+    """
+    Runs every workers x threads split that fits the core count for `seconds` on one image and
+    reports images per second, best first.
+    """
+    import multiprocessing as mp
+
+    cores = int(os.getenv("BLEEP_CPU_CORES") or (cfg.get("cpu", {}) or {}).get("cores") or _visible_cores())
+    splits = [(w, cores // w) for w in range(1, cores + 1) if cores // w >= 1 and cores % w == 0]
+    ctx = mp.get_context("spawn")
+
+    rows = []
+    for workers, threads in splits:
+        with ctx.Pool(workers) as pool:
+            t0 = time.perf_counter()
+            done = sum(pool.map(_sweep_worker, [(cfg, image_path, threads, seconds)] * workers))
+            wall = time.perf_counter() - t0
+        rows.append({"workers": workers, "threads": threads, "images": done, "ips": done / seconds})
+        print(f"[cpu sweep] workers={workers} threads={threads} images/s={done / seconds:.2f} wall={wall:.0f}s")
+
+    rows.sort(key=lambda r: r["ips"], reverse=True)
+    best = rows[0]
+    print(f"[cpu sweep] best: cpu.workers={best['workers']} (threads per worker {best['threads']})")
+    return rows
+
+
+def main():
+    import yaml
+
+    ap = argparse.ArgumentParser(description="Sweep worker and thread splits for this machine")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--image", required=True, help="representative sample image")
+    ap.add_argument("--seconds", type=float, default=30.0)
+    args = ap.parse_args()
+
+    with open(args.config, "r") as f:
+        cfg = yaml.safe_load(f)
+    sweep(cfg, args.image, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+from __future__ import annotations
+from typing import Dict, Any, Optional
+import math
+import threading
+import time
+import numpy as np
+import cv2
+
+MODES = ("off", "shadow", "on")
+
+
+class SceneGate:
+    """
+    Cheap per-image check that decides whether the plate and text branches can produce hits.
+
+    On a thumbnail: Canny edge density, then text-line blobs from a morphological gradient closed
+    horizontally. Blobs shaped like a line of characters count as text regions, the shorter ones
+    with a plate's aspect ratio also count as plate regions. A near-flat scene (sky, skin, food)
+    fails the edge check and skips both branches.
+
+    Mode "shadow" runs every branch anyway and counts how often a skip would have missed a hit,
+    use it to tune conservatism before switching to "on". Effective thresholds are the configured
+    ones times (1 - conservatism), conservatism 1 never skips.
+
+    Config keys supported under cfg["scene_gate"]:
+      mode: off | shadow | on     default off
+      conservatism: float         0..1, default 0.5
+      max_side: int               thumbnail long side, default 512
+      min_edge_density: float     default 0.02
+      min_text_regions: int       default 2
+      min_plate_regions: int      default 1
+    """
+
+    def __init__(
+        self,
+        mode: str = "off",
+        conservatism: float = 0.5,
+        max_side: int = 512,
+        min_edge_density: float = 0.02,
+        min_text_regions: int = 2,
+        min_plate_regions: int = 1,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"scene_gate.mode must be one of {MODES}, got {mode!r}")
+        keep = 1.0 - min(1.0, max(0.0, float(conservatism)))
+        self.mode = mode
+        self.max_side = int(max_side)
+        self.min_edge_density = float(min_edge_density) * keep
+        self.min_text_regions = math.ceil(int(min_text_regions) * keep)
+        self.min_plate_regions = math.ceil(int(min_plate_regions) * keep)
+
+        self._lock = threading.Lock()
+        self.counts = {"images": 0, "lp_skipped": 0, "text_skipped": 0, "lp_missed": 0, "text_missed": 0}
+
+    def _thumb_gray(self, img_rgb: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(np.ascontiguousarray(img_rgb), cv2.COLOR_RGB2GRAY)
+        h, w = gray.shape[:2]
+        scale = self.max_side / max(h, w)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+        return gray
+
+    def check(self, img_rgb: np.ndarray) -> Dict[str, Any]:
+        """
+        Returns {"lp": bool, "text": bool, ...scores}, True means the branch should run.
+        In shadow mode both come back True and the would-be decision is under "would_run".
+        """
+        t0 = time.perf_counter()
+        gray = self._thumb_gray(img_rgb)
+        h, w = gray.shape[:2]
+
+        edges = cv2.Canny(gray, 60, 180)
+        edge_density = float(np.count_nonzero(edges)) / edges.size
+
+        text_regions = plate_regions = 0
+        if edge_density >= self.min_edge_density:
+            grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+            otsu, _ = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+            # a floor on the threshold keeps sensor noise on flat images from forming blobs
+            _, bw = cv2.threshold(grad, max(otsu, 40), 255, cv2.THRESH_BINARY)
+            closed = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+            _, _, stats, _ = cv2.connectedComponentsWithStats(closed, connectivity=8)
+            bw_, bh_, area = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT], stats[1:, cv2.CC_STAT_AREA]
+            fill = area / np.maximum(1, bw_ * bh_)
+            aspect = bw_ / np.maximum(1, bh_)
+            texty = (bh_ >= 4) & (bh_ <= 0.25 * h) & (aspect >= 1.5) & (fill >= 0.3)
+            platey = texty & (aspect <= 7.0) & (bw_ <= 0.5 * w)
+            text_regions = int(np.count_nonzero(texty))
+            plate_regions = int(np.count_nonzero(platey))
+
+        would = {
+            "lp": plate_regions >= self.min_plate_regions,
+            "text": text_regions >= self.min_text_regions,
+        }
+        with self._lock:
+            self.counts["images"] += 1
+            self.counts["lp_skipped"] += int(not would["lp"])
+            self.counts["text_skipped"] += int(not would["text"])
+
+        run = would if self.mode == "on" else {"lp": True, "text": True}
+        return {
+            **run,
+            "would_run": would,
+            "edge_density": edge_density,
+            "text_regions": text_regions,
+            "plate_regions": plate_regions,
+            "ms": (time.perf_counter() - t0) * 1000.0,
+        }
+
+    def record(self, decision: Dict[str, Any], lp_hits: int, text_hits: int) -> None:
+        """
+        Shadow mode bookkeeping: a branch that would have been skipped but found something is a miss.
+        """
+        would = decision["would_run"]
+        with self._lock:
+            self.counts["lp_missed"] += int(not would["lp"] and lp_hits > 0)
+            self.counts["text_missed"] += int(not would["text"] and text_hits > 0)
+
+    def signature(self) -> str:
+        return f"{self.max_side}:{self.min_edge_density}:{self.min_text_regions}:{self.min_plate_regions}"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            c = dict(self.counts)
+        c["mode"] = self.mode
+        return with_rates(c)
+
+
+def with_rates(counts: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Adds skip rates to gate counters, also used on counters summed over processes.
+    """
+    c = dict(counts)
+    n = max(1, c["images"])
+    c["lp_skip_rate"] = c["lp_skipped"] / n
+    c["text_skip_rate"] = c["text_skipped"] / n
+    return c
+
+
+_GATE: Optional[SceneGate] = None
+
+
+def get_scene_gate(cfg: Dict[str, Any]) -> Optional[SceneGate]:
+    """
+    Process-wide gate built from cfg["scene_gate"], None when mode is off.
+    """
+    global _GATE
+    g = cfg.get("scene_gate", {}) or {}
+    mode = g.get("mode", "off")
+    # YAML 1.1 reads a bare off/on as a bool
+    mode = ("on" if mode else "off") if isinstance(mode, bool) else str(mode)
+    if mode == "off":
+        return None
+    if _GATE is None:
+        _GATE = SceneGate(
+            mode=mode,
+            conservatism=float(g.get("conservatism", 0.5)),
+            max_side=int(g.get("max_side", 512)),
+            min_edge_density=float(g.get("min_edge_density", 0.02)),
+            min_text_regions=int(g.get("min_text_regions", 2)),
+            min_plate_regions=int(g.get("min_plate_regions", 1)),
+        )
+    return _GATE
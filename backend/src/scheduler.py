@@ -0,0 +1,110 @@
+from typing import Dict, Any, Optional, List
+from contextlib import contextmanager
+import copy
+import threading
+
+# Best first, the scheduler walks down until the estimate fits the deadline
+TIERS = ("full", "reduced", "minimal")
+
+
+def _merge(base: Dict[str, Any], over: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(base)
+    for k, v in (over or {}).items():
+        out[k] = _merge(out.get(k) or {}, v) if isinstance(v, dict) else v
+    return out
+
+
+def tier_config(cfg: Dict[str, Any], tier: str) -> Dict[str, Any]:
+    """
+    cfg with cfg["shedding"]["tiers"][tier] merged on top and cfg["tier"] set.
+    detect_image_np keeps non-full results out of the detection store and near-duplicate index.
+    """
+    over = ((cfg.get("shedding") or {}).get("tiers") or {}).get(tier) or {}
+    out = _merge(copy.deepcopy(cfg), over)
+    out["tier"] = tier
+    return out
+
+
+class LoadScheduler:
+    """
+    Picks a pipeline tier per request so it finishes inside its deadline.
+
+    Models are shared and mostly serialized, so a request waits for the work already in flight.
+    The estimate for a tier is the sum of the moving-average latency of every in-flight request's
+    tier plus its own. The best tier whose estimate fits is chosen, capped by queue depth:
+    at reduced_depth in-flight requests full is off the table, at minimal_depth only minimal is.
+    A request that fits no tier still runs, at minimal. Observed latency includes time spent waiting
+    on other requests, so estimates of skipped tiers drift back to their priors while the server is idle.
+
+    Config keys supported under cfg["shedding"]:
+      enabled: bool               default False
+      default_deadline_ms: float  when the request sends none, default 3000
+      reduced_depth: int          default 4
+      minimal_depth: int          default 8
+      expected_ms: dict           per-tier latency priors, default full 2000, reduced 800, minimal 300
+      tiers: dict                 per-tier config overrides, see tier_config
+    """
+
+    def __init__(self, cfg: Dict[str, Any]):
+        s = cfg.get("shedding", {}) or {}
+        self.default_deadline_ms = float(s.get("default_deadline_ms", 3000))
+        self.reduced_depth = int(s.get("reduced_depth", 4))
+        self.minimal_depth = int(s.get("minimal_depth", 8))
+        priors = {"full": 2000.0, "reduced": 800.0, "minimal": 300.0}
+        priors.update({k: float(v) for k, v in (s.get("expected_ms") or {}).items()})
+        self.priors = {t: priors[t] for t in TIERS}
+        self.latency_ms: Dict[str, float] = dict(self.priors)
+        self.counts: Dict[str, int] = {t: 0 for t in TIERS}
+        self._configs = {t: tier_config(cfg, t) for t in TIERS}
+        self._inflight: List[str] = []
+        self._lock = threading.Lock()
+
+    def config(self, tier: str) -> Dict[str, Any]:
+        return self._configs[tier]
+
+    def choose(self, deadline_ms: Optional[float] = None) -> str:
+        budget = self.default_deadline_ms if deadline_ms is None else float(deadline_ms)
+        with self._lock:
+            depth = len(self._inflight)
+            ahead = sum(self.latency_ms[t] for t in self._inflight)
+            allowed = TIERS
+            if depth >= self.minimal_depth:
+                allowed = TIERS[2:]
+            elif depth >= self.reduced_depth:
+                allowed = TIERS[1:]
+            for tier in allowed:
+                if ahead + self.latency_ms[tier] <= budget:
+                    return tier
+                if depth == 0:
+                    # observed latency includes queueing, let an idle server win the better tiers back
+                    self.latency_ms[tier] = 0.8 * self.latency_ms[tier] + 0.2 * self.priors[tier]
+        return TIERS[-1]
+
+    @contextmanager
+    def track(self, tier: str):
+        with self._lock:
+            self._inflight.append(tier)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._inflight.remove(tier)
+
+    def observe(self, tier: str, total_ms: float) -> None:
+        with self._lock:
+            self.latency_ms[tier] = 0.8 * self.latency_ms[tier] + 0.2 * float(total_ms)
+            self.counts[tier] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "inflight": len(self._inflight),
+                "latency_ms": dict(self.latency_ms),
+                "counts": dict(self.counts),
+            }
+
+
+def build_scheduler(cfg: Dict[str, Any]) -> Optional[LoadScheduler]:
+    if not bool((cfg.get("shedding", {}) or {}).get("enabled", False)):
+        return None
+    return LoadScheduler(cfg)
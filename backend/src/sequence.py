@@ -0,0 +1,198 @@
+from __future__ import annotations
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, Optional
+import time
+import numpy as np
+import cv2
+
+from .redactor import apply_redactions
+from .registry import run_detectors
+
+
+# ---------- Burst and video path, full detection on keyframes only ----------
+
+def _gray(img_rgb: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(np.ascontiguousarray(img_rgb), cv2.COLOR_RGB2GRAY)
+
+
+def _thumb(gray: np.ndarray) -> np.ndarray:
+    return cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def _crop(gray: np.ndarray, b: Dict[str, Any]) -> np.ndarray:
+    return gray[b["y1"]:b["y2"], b["x1"]:b["x2"]]
+
+
+def iter_video_frames(path: str, stride: int = 1) -> Iterator[np.ndarray]:
+    """
+    Yields RGB frames from a video file, every `stride`-th frame.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video {path}")
+    try:
+        i = 0
+        while True:
+            ok, frame_bgr = cap.read()
+            if not ok:
+                break
+            if i % stride == 0:
+                yield cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+            i += 1
+    finally:
+        cap.release()
+
+
+class SequenceProcessor:
+    """
+    Redacts consecutive frames of one burst or clip, keeping state between calls.
+
+    Keyframes run every registered detector (run_detectors). Frames in between move
+    each box with normalized template matching in a small search window around its last position.
+    Text boxes whose content changed since they were last read get the non-plate detectors again
+    on that region only.
+    A keyframe is forced every sequence.keyframe_interval frames, on a scene cut, or when a track is lost.
+
+    Config keys supported under cfg["sequence"]:
+      keyframe_interval: int      default 10
+      scene_cut: float            mean abs diff on a 64x36 thumbnail, default 30
+      search_margin: float        search window growth relative to box size, default 0.5
+      min_track_score: float      template match score to keep a track, default 0.5
+      reocr_change: float         mean abs diff that triggers a region re-OCR, default 12
+    """
+
+    def __init__(self, cfg: Dict[str, Any]):
+        self.cfg = cfg
+        seq_cfg = cfg.get("sequence", {}) or {}
+        self.keyframe_interval = max(1, int(seq_cfg.get("keyframe_interval", 10)))
+        self.scene_cut = float(seq_cfg.get("scene_cut", 30.0))
+        self.search_margin = float(seq_cfg.get("search_margin", 0.5))
+        self.min_track_score = float(seq_cfg.get("min_track_score", 0.5))
+        self.reocr_change = float(seq_cfg.get("reocr_change", 12.0))
+
+        self.frame_index = -1
+        self.since_key = 0
+        self.key_thumb: Optional[np.ndarray] = None
+        self.prev_gray: Optional[np.ndarray] = None
+        self.tracks: List[Dict[str, Any]] = []
+        self.force_key = True
+
+    def reset(self) -> None:
+        self.__init__(self.cfg)
+
+    def _keyframe(self, img_rgb: np.ndarray, gray: np.ndarray) -> None:
+        found, _ = run_detectors(img_rgb, self.cfg)
+        lp_boxes = [b.to_dict() for b in found.pop("license_plate", [])]
+        pii_boxes = [b.to_dict() for boxes in found.values() for b in boxes]
+        self.tracks = []
+        for kind, boxes in (("lp", lp_boxes), ("pii", pii_boxes)):
+            for b in boxes:
+                if b["x2"] <= b["x1"] or b["y2"] <= b["y1"]:
+                    continue
+                ref = _crop(gray, b).copy()
+                self.tracks.append({"kind": kind, "box": b, "template": ref, "ref": ref})
+        self.key_thumb = _thumb(gray)
+        self.since_key = 0
+        self.force_key = False
+
+    def _track(self, gray: np.ndarray, t: Dict[str, Any]) -> bool:
+        b = t["box"]
+        h, w = gray.shape[:2]
+        bw, bh = b["x2"] - b["x1"], b["y2"] - b["y1"]
+        mx = max(8, int(bw * self.search_margin))
+        my = max(8, int(bh * self.search_margin))
+        sx1, sy1 = max(0, b["x1"] - mx), max(0, b["y1"] - my)
+        sx2, sy2 = min(w, b["x2"] + mx), min(h, b["y2"] + my)
+        tmpl = t["template"]
+        search = gray[sy1:sy2, sx1:sx2]
+        if search.shape[0] < tmpl.shape[0] or search.shape[1] < tmpl.shape[1]:
+            return False
+
+        res = cv2.matchTemplate(search, tmpl, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (lx, ly) = cv2.minMaxLoc(res)
+        if not np.isfinite(score) or score < self.min_track_score:
+            return False
+
+        nx1, ny1 = sx1 + lx, sy1 + ly
+        t["box"] = dict(b, x1=nx1, y1=ny1, x2=nx1 + tmpl.shape[1], y2=ny1 + tmpl.shape[0])
+        t["template"] = _crop(gray, t["box"]).copy()
+        return True
+
+    def _reocr(self, img_rgb: np.ndarray, gray: np.ndarray, t: Dict[str, Any]) -> None:
+        b = t["box"]
+        h, w = gray.shape[:2]
+        pad = max(4, (b["y2"] - b["y1"]) // 2)
+        x1, y1 = max(0, b["x1"] - pad), max(0, b["y1"] - pad)
+        x2, y2 = min(w, b["x2"] + pad), min(h, b["y2"] + pad)
+        found, _ = run_detectors(np.ascontiguousarray(img_rgb[y1:y2, x1:x2]), self.cfg, skip={"lp"})
+        hits = [
+            r for boxes in found.values() for r in (b.to_dict() for b in boxes)
+            if r["x2"] > r["x1"] and r["y2"] > r["y1"]
+        ]
+        if hits:
+            best = max(hits, key=lambda r: r.get("score") or 0.0)
+            t["box"] = dict(best, x1=best["x1"] + x1, y1=best["y1"] + y1, x2=best["x2"] + x1, y2=best["y2"] + y1)
+            t["template"] = _crop(gray, t["box"]).copy()
+        # no hit keeps the tracked box, a missed redaction is worse than a stale one
+        t["ref"] = t["template"]
+
+    def process(self, img_rgb: np.ndarray) -> Tuple[np.ndarray, Dict[str, Any], bool]:
+        if img_rgb.ndim != 3 or img_rgb.shape[2] != 3:
+            raise ValueError(f"Expected HxWx3 RGB, got shape {img_rgb.shape}")
+
+        t0 = time.perf_counter()
+        self.frame_index += 1
+        gray = _gray(img_rgb)
+
+        is_key = (
+            self.force_key
+            or self.prev_gray is None
+            or self.prev_gray.shape != gray.shape
+            or self.since_key >= self.keyframe_interval
+            or float(np.mean(np.abs(_thumb(gray) - self.key_thumb))) > self.scene_cut
+        )
+
+        reocr = 0
+        if is_key:
+            self._keyframe(img_rgb, gray)
+        else:
+            self.since_key += 1
+            for t in self.tracks:
+                if not self._track(gray, t):
+                    # lost track, keep the old box this frame and resync on the next one
+                    self.force_key = True
+                    continue
+                if t["kind"] == "pii" and t["ref"].shape == t["template"].shape:
+                    diff = np.mean(np.abs(t["template"].astype(np.int16) - t["ref"].astype(np.int16)))
+                    if diff > self.reocr_change:
+                        self._reocr(img_rgb, gray, t)
+                        reocr += 1
+        self.prev_gray = gray
+
+        boxes = [dict(t["box"]) for t in self.tracks]
+        redacted_rgb, applied = apply_redactions(img_rgb, boxes, self.cfg)
+        n_lp = sum(1 for t in self.tracks if t["kind"] == "lp")
+
+        meta = {
+            "frame_index": self.frame_index,
+            "keyframe": is_key,
+            "boxes": boxes,
+            "counts": {
+                "license_plates": n_lp,
+                "pii": len(boxes) - n_lp,
+                "total": len(boxes),
+                "reocr": reocr,
+            },
+            "timings_ms": {"total": (time.perf_counter() - t0) * 1000.0},
+        }
+        return redacted_rgb, meta, applied
+
+
+def process_sequence(
+    frames: Iterable[np.ndarray], cfg: Dict[str, Any]
+) -> Iterator[Tuple[np.ndarray, Dict[str, Any], bool]]:
+    """
+    Redacts a burst or clip frame by frame, yields (redacted_rgb, meta, applied) per frame.
+    """
+    proc = SequenceProcessor(cfg)
+    for frame in frames:
+        yield proc.process(frame)
@@ -0,0 +1,232 @@
+from __future__ import annotations
+from typing import List, Dict, Any, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import tempfile
+import time
+import numpy as np
+
+from .redactor import apply_redactions
+from .registry import run_detectors
+
+
+# ---------- Tiled path for panoramas and large scans ----------
+
+def _tiling_cfg(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    t = cfg.get("tiling", {}) or {}
+    tile = int(t.get("tile_size", 1280))
+    overlap = int(t.get("overlap", 160))
+    if overlap * 2 >= tile:
+        raise ValueError(f"tiling.overlap {overlap} must be less than half of tiling.tile_size {tile}")
+    return {
+        "enabled": bool(t.get("enabled", False)),
+        "min_pixels": int(t.get("min_pixels", 24_000_000)),
+        "tile_size": tile,
+        "overlap": overlap,
+        "workers": max(1, int(t.get("workers", 4))),
+        "merge_iou": float(t.get("merge_iou", 0.5)),
+        "merge_containment": float(t.get("merge_containment", 0.8)),
+        "out_dir": t.get("out_dir") or None,
+    }
+
+
+def should_tile(img_rgb: np.ndarray, cfg: Dict[str, Any]) -> bool:
+    tc = _tiling_cfg(cfg)
+    h, w = img_rgb.shape[:2]
+    return tc["enabled"] and h * w >= tc["min_pixels"]
+
+
+def tile_grid(h: int, w: int, tile: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Returns (x0, y0, x1, y1) windows that cover the image, neighbours share `overlap` pixels.
+    The last row and column are shifted back so every tile keeps full size when the image allows it.
+    """
+    step = tile - overlap
+
+    def starts(n: int) -> List[int]:
+        if n <= tile:
+            return [0]
+        s = list(range(0, n - tile, step))
+        s.append(n - tile)
+        return s
+
+    return [
+        (x0, y0, min(w, x0 + tile), min(h, y0 + tile))
+        for y0 in starts(h)
+        for x0 in starts(w)
+    ]
+
+
+def _detect_tile(
+    img_rgb: np.ndarray, win: Tuple[int, int, int, int], cfg: Dict[str, Any]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, float]]:
+    x0, y0, x1, y1 = win
+    crop = np.ascontiguousarray(img_rgb[y0:y1, x0:x1, :])
+    # every enabled detector on the tile's shared views, like the single-image path
+    found, det_ms = run_detectors(crop, cfg)
+    lp_boxes = [b.to_dict() for b in found.pop("license_plate", [])]
+    pii_boxes = [b.to_dict() for boxes in found.values() for b in boxes]
+    for b in lp_boxes + pii_boxes:
+        b["x1"] += x0
+        b["x2"] += x0
+        b["y1"] += y0
+        b["y2"] += y0
+    return lp_boxes, pii_boxes, det_ms
+
+
+def _area(b: Dict[str, Any]) -> int:
+    return max(0, b["x2"] - b["x1"]) * max(0, b["y2"] - b["y1"])
+
+
+def merge_seam_boxes(boxes: List[Dict[str, Any]], iou: float = 0.5, containment: float = 0.8) -> List[Dict[str, Any]]:
+    """
+    De-duplicates boxes found twice in the overlap between tiles.
+    Two boxes with the same label merge into their union when IoU >= iou, or when the smaller one
+    lies mostly inside the larger (a plate cut by one tile edge, whole in the neighbour).
+    """
+    order = sorted(boxes, key=lambda b: (b.get("score") or 0.0), reverse=True)
+    kept: List[Dict[str, Any]] = []
+    for b in order:
+        merged = False
+        for k in kept:
+            if k.get("label") != b.get("label"):
+                continue
+            ix = min(k["x2"], b["x2"]) - max(k["x1"], b["x1"])
+            iy = min(k["y2"], b["y2"]) - max(k["y1"], b["y1"])
+            if ix <= 0 or iy <= 0:
+                continue
+            inter = ix * iy
+            a_k, a_b = _area(k), _area(b)
+            union = a_k + a_b - inter
+            if (union and inter / union >= iou) or (min(a_k, a_b) and inter / min(a_k, a_b) >= containment):
+                k["x1"], k["y1"] = min(k["x1"], b["x1"]), min(k["y1"], b["y1"])
+                k["x2"], k["y2"] = max(k["x2"], b["x2"]), max(k["y2"], b["y2"])
+                merged = True
+                break
+        if not merged:
+            kept.append(dict(b))
+    return kept
+
+
+def _render_tiled(
+    img_rgb: np.ndarray, boxes: List[Dict[str, Any]], cfg: Dict[str, Any], tile: int, out_path: Optional[str], out_dir: Optional[str]
+) -> Tuple[np.ndarray, bool]:
+    h, w = img_rgb.shape[:2]
+    if out_path:
+        out = np.memmap(out_path, dtype=np.uint8, mode="w+", shape=(h, w, 3))
+    else:
+        # unlinked temp file, released with the last reference to the array
+        out = np.memmap(tempfile.TemporaryFile(dir=out_dir), dtype=np.uint8, mode="w+", shape=(h, w, 3))
+
+    applied = False
+    for y0 in range(0, h, tile):
+        for x0 in range(0, w, tile):
+            y1, x1 = min(h, y0 + tile), min(w, x0 + tile)
+            # one extra pixel right and below so boxes crossing the tile edge are not clipped short of it
+            ye, xe = min(h, y1 + 1), min(w, x1 + 1)
+            local = [
+                dict(b, x1=b["x1"] - x0, y1=b["y1"] - y0, x2=b["x2"] - x0, y2=b["y2"] - y0)
+                for b in boxes
+                if b["x1"] < xe and b["x2"] > x0 and b["y1"] < ye and b["y2"] > y0
+            ]
+            src = img_rgb[y0:ye, x0:xe, :]
+            if local:
+                red, hit = apply_redactions(src, local, cfg)
+                applied = applied or hit
+            else:
+                red = src
+            out[y0:y1, x0:x1, :] = red[: y1 - y0, : x1 - x0, :]
+    out.flush()
+    return out, applied
+
+
+def detect_tiled(
+    img_rgb: np.ndarray, cfg: Dict[str, Any]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Detection half of process_image_tiled, returns (lp_boxes, pii_boxes, tiling_info)
+    in full-image coordinates with seam duplicates merged.
+
+    YOLO runs at imgsz=tile_size, so a tile is not shrunk to the model's training size.
+    tiling_info["detector_ms"] sums each detector's time over all tiles.
+    """
+    tc = _tiling_cfg(cfg)
+    h, w = img_rgb.shape[:2]
+    grid = tile_grid(h, w, tc["tile_size"], tc["overlap"])
+    print(f"Tiled processing {w}x{h} in {len(grid)} tiles")
+    tile_cfg = dict(cfg, lp=dict(cfg.get("lp", {}) or {}, imgsz=tc["tile_size"]))
+
+    lp_boxes: List[Dict[str, Any]] = []
+    pii_boxes: List[Dict[str, Any]] = []
+    det_ms: Dict[str, float] = {}
+    with ThreadPoolExecutor(max_workers=tc["workers"]) as pool:
+        # a context copy per tile keeps the request's model version record (record_versions)
+        futures = [pool.submit(contextvars.copy_context().run, _detect_tile, img_rgb, win, tile_cfg) for win in grid]
+        for fut in futures:
+            tile_lp, tile_pii, tile_ms = fut.result()
+            lp_boxes.extend(tile_lp)
+            pii_boxes.extend(tile_pii)
+            for name, ms in tile_ms.items():
+                det_ms[name] = det_ms.get(name, 0.0) + ms
+    raw_count = len(lp_boxes) + len(pii_boxes)
+    lp_boxes = merge_seam_boxes(lp_boxes, iou=tc["merge_iou"], containment=tc["merge_containment"])
+    pii_boxes = merge_seam_boxes(pii_boxes, iou=tc["merge_iou"], containment=tc["merge_containment"])
+    return lp_boxes, pii_boxes, {
+        "tiles": len(grid), "tile_size": tc["tile_size"], "raw_boxes": raw_count, "detector_ms": det_ms,
+    }
+
+
+def split_tiled_ms(info: Dict[str, Any], wall_ms: float) -> Tuple[float, float]:
+    """
+    Splits the wall time of detect_tiled into the (lp, pii) timings of the single-image path.
+    Tiles overlap in time, so plates get their share of the summed detector time and pii the rest.
+    """
+    det_ms = info.get("detector_ms") or {}
+    busy = sum(det_ms.values())
+    lp_ms = wall_ms * det_ms.get("license_plate", 0.0) / busy if busy > 0 else 0.0
+    return lp_ms, wall_ms - lp_ms
+
+
+def process_image_tiled(
+    img_rgb: np.ndarray, cfg: Dict[str, Any], out_path: Optional[str] = None
+) -> Tuple[np.ndarray, Dict[str, Any], bool]:
+    """
+    Tiled variant of process_image_np for very large inputs.
+    Detection and OCR run per overlapping tile in a thread pool at native resolution, boxes found
+    twice along a seam are merged, and redaction is written tile by tile into a memory-mapped
+    output, so working memory scales with cfg["tiling"]["tile_size"] and not the image.
+
+    img_rgb may itself be an np.memmap. Returns the same (redacted, meta, applied) triple and
+    timings_ms keys as process_image_np, the redacted array is an np.memmap backed by out_path or
+    an anonymous temp file. Tiled images bypass the detection store and the near-duplicate index,
+    both are keyed to whole images of ordinary size.
+    """
+    if img_rgb.ndim != 3 or img_rgb.shape[2] != 3:
+        raise ValueError(f"Expected HxWx3 RGB, got shape {img_rgb.shape}")
+
+    tc = _tiling_cfg(cfg)
+    t0 = time.perf_counter()
+    lp_boxes, pii_boxes, info = detect_tiled(img_rgb, cfg)
+    boxes = lp_boxes + pii_boxes
+    t1 = time.perf_counter()
+
+    redacted, applied = _render_tiled(img_rgb, boxes, cfg, tc["tile_size"], out_path, tc["out_dir"])
+    t2 = time.perf_counter()
+    lp_ms, pii_ms = split_tiled_ms(info, (t1 - t0) * 1000.0)
+
+    meta = {
+        "boxes": boxes,
+        "counts": {
+            "license_plates": len(lp_boxes),
+            "pii": len(pii_boxes),
+            "total": len(boxes),
+        },
+        "tiling": info,
+        "timings_ms": {
+            "lp": lp_ms,
+            "pii": pii_ms,
+            "redact": (t2 - t1) * 1000.0,
+            "total": (t2 - t0) * 1000.0,
+        },
+    }
+    return redacted, meta, applied
@@ -47,4 +47,38 @@ export async function sendImageForRedaction(fileUri: string) {
   const uri = `${displayUri}?t=${Date.now()}`;
 
   return { uri: uri, applied };
-}
\ No newline at end of file
+}
+
+export type RedactionBoxes = {
+  width: number;
+  height: number;
+  labels: string[];
+  // [x1, y1, x2, y2, labelIndex] in original image pixels
+  boxes: [number, number, number, number, number][];
+};
+
+// Boxes only, no image comes back. Pass the original size when fileUri is a downscaled proxy.
+export async function fetchRedactionBoxes(
+  fileUri: string,
+  original?: { width: number; height: number }
+): Promise<RedactionBoxes> {
+  const normalized = await normalizeToFileUri(fileUri);
+
+  const form = new FormData();
+  form.append("file", {
+    uri: normalized,
+    name: filenameFromUri(normalized),
+    type: "image/jpeg",
+  } as any);
+  if (original) {
+    form.append("orig_width", String(original.width));
+    form.append("orig_height", String(original.height));
+  }
+
+  const res = await apiFetch("/detect", {
+    method: "POST",
+    headers: { Accept: "application/json" },
+    body: form,
+  });
+  return (await res.json()) as RedactionBoxes;
+}
@@ -7,10 +7,17 @@ DISTIL_DIR = ROOT / "distilbert-base-uncased"
 TOKENIZER_DIR = ROOT / "tokenizer"  # you already have this
 YOLO_OUT = ROOT / "LP-detection.pt"
 
-SPACY_WHL = (
-    "https://github.com/explosion/spacy-models/releases/download/"
-    "en_core_web_lg-3.7.1/en_core_web_lg-3.7.1-py3-none-any.whl"
-)
+SPACY_WHLS = {
+    "en_core_web_lg": (
+        "https://github.com/explosion/spacy-models/releases/download/"
+        "en_core_web_lg-3.7.1/en_core_web_lg-3.7.1-py3-none-any.whl"
+    ),
+    # shedding.tiers.reduced.pii.nlp_model
+    "en_core_web_sm": (
+        "https://github.com/explosion/spacy-models/releases/download/"
+        "en_core_web_sm-3.7.1/en_core_web_sm-3.7.1-py3-none-any.whl"
+    ),
+}
 
 def log(m): print(f"[models] {m}")
 
@@ -42,12 +49,13 @@ def download(url: str, dest: Path):
         raise RuntimeError(f"failed to download {url}")
 
 def install_spacy():
-    if try_import("en_core_web_lg"):
-        log("spaCy model already installed")
-        return
-    pip_install(SPACY_WHL)
-    if not try_import("en_core_web_lg"):
-        raise RuntimeError("en_core_web_lg import failed after install")
+    for name, whl in SPACY_WHLS.items():
+        if try_import(name):
+            log(f"spaCy model {name} already installed")
+            continue
+        pip_install(whl)
+        if not try_import(name):
+            raise RuntimeError(f"{name} import failed after install")
 
 def install_distilbert():
     # If you already exported ONNX, keep tokenizer files under models/tokenizer